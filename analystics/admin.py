@@ -1,3 +1,27 @@
 from django.contrib import admin
 
-# Register your models here.
+from shortener.admin import EstimatedCountPaginator
+from shortener.models import Click
+
+from .models import FeedConsumer
+
+
+@admin.register(Click)
+class ClickAdmin(admin.ModelAdmin):
+    list_display = ("id", "url", "clicked_at", "ip_address", "referrer", "weight")
+    # One JOIN instead of a query per row for the url column
+    list_select_related = ("url",)
+    list_filter = (("clicked_at", admin.DateFieldListFilter),)
+    search_fields = ("=url__short_code",)
+    # Primary key order, clicked_at follows it anyway
+    ordering = ("-id",)
+    autocomplete_fields = ("url",)
+    raw_id_fields = ("destination",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(FeedConsumer)
+class FeedConsumerAdmin(admin.ModelAdmin):
+    list_display = ("name", "last_click_id", "updated_at")
+    readonly_fields = ("token", "updated_at")
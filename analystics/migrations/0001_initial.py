@@ -0,0 +1,39 @@
+# Generated by Django 6.0.1 on 2026-10-19 20:11
+
+import analystics.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="FeedConsumer",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=50, unique=True)),
+                (
+                    "token",
+                    models.CharField(
+                        default=analystics.models.generate_feed_token,
+                        max_length=64,
+                        unique=True,
+                    ),
+                ),
+                ("last_click_id", models.BigIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
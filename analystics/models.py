@@ -1,3 +1,20 @@
+import secrets
+
 from django.db import models
 
-# Create your models here.
+
+def generate_feed_token():
+    return secrets.token_urlsafe(32)
+
+
+class FeedConsumer(models.Model):
+    """A downstream system reading the click feed, with its durable offset"""
+
+    name = models.CharField(max_length=50, unique=True)
+    token = models.CharField(max_length=64, unique=True, default=generate_feed_token)
+    # Id of the last click the consumer has committed
+    last_click_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
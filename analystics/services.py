@@ -1,3 +1,311 @@
-from django.test import TestCase
+import csv
+import json
+import zlib
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
-# Create your tests here.
+from django.conf import settings
+from django.db.models import Max, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from shortener.models import Click
+
+# Bucket sizes for click time series
+GRANULARITIES = {
+    "minute": timedelta(minutes=1),
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+    "week": timedelta(weeks=1),
+}
+
+
+def parse_series_params(params):
+    """Read start, end, granularity and tz from query params
+
+    Naive datetimes (or plain dates) are read in the given time zone.
+    Raises ValueError with a readable message on bad input.
+    """
+    zone = _parse_zone(params)
+
+    granularity = params.get("granularity") or "day"
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of: {', '.join(GRANULARITIES)}")
+
+    end = _parse_moment(params.get("end"), zone) or timezone.now()
+    start = _parse_moment(params.get("start"), zone) or end - timedelta(days=7)
+    if start >= end:
+        raise ValueError("start must be before end")
+
+    points = (end - start) / GRANULARITIES[granularity]
+    if points > settings.ANALYTICS_SERIES_MAX_POINTS:
+        raise ValueError("Range too large for this granularity")
+
+    return start, end, granularity, zone
+
+
+def _parse_zone(params):
+    tz_name = params.get("tz") or settings.TIME_ZONE
+    try:
+        return ZoneInfo(tz_name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Unknown time zone: {tz_name}")
+
+
+def _parse_moment(value, zone):
+    if not value:
+        return None
+
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid date: {value}")
+        moment = datetime.combine(day, time.min)
+
+    if timezone.is_naive(moment):
+        moment = moment.replace(tzinfo=zone)
+    return moment
+
+
+def bucket_start(moment, granularity, zone):
+    """Local (naive) start of the bucket containing `moment`"""
+    local = moment.astimezone(zone).replace(tzinfo=None)
+    if granularity == "minute":
+        return local.replace(second=0, microsecond=0)
+    if granularity == "hour":
+        return local.replace(minute=0, second=0, microsecond=0)
+
+    day = local.replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularity == "week":
+        day -= timedelta(days=day.weekday())  # Weeks start on Monday
+    return day
+
+
+def click_series(clicks, start, end, granularity, zone):
+    """Yield (bucket, clicks) for every bucket between start and end
+
+    Counts come from GROUP BY queries over the truncated click time, one
+    per ANALYTICS_SERIES_QUERY_BUCKETS buckets, each read in full before
+    its buckets are handed on. A slow client streaming a long series thus
+    never keeps a read open. Empty buckets are filled with 0. Buckets are
+    naive local datetimes.
+    """
+    counts = _series_counts(clicks, start, end, granularity, zone)
+    next_row = next(counts, None)
+
+    step = GRANULARITIES[granularity]
+    bucket = bucket_start(start, granularity, zone)
+    last = bucket_start(end - timedelta(microseconds=1), granularity, zone)
+
+    while bucket <= last:
+        count = 0
+        # Rows and buckets are both sorted, so a single merge pass is enough
+        while next_row is not None and next_row[0] <= bucket:
+            if next_row[0] == bucket:
+                count += next_row[1]
+            next_row = next(counts, None)
+
+        yield bucket, count
+        bucket += step
+
+
+def _series_counts(clicks, start, end, granularity, zone):
+    """(bucket, count) rows in bucket order, a short query per window
+
+    A bucket cut by a window boundary comes back as two rows in a row,
+    click_series() adds them up.
+    """
+    window = GRANULARITIES[granularity] * settings.ANALYTICS_SERIES_QUERY_BUCKETS
+    lower = start
+    while lower < end:
+        upper = min(lower + window, end)
+        rows = list(
+            clicks.filter(clicked_at__gte=lower, clicked_at__lt=upper)
+            .annotate(bucket=Trunc("clicked_at", granularity, tzinfo=zone))
+            .values_list("bucket")
+            .annotate(count=Sum("weight"))
+            .order_by("bucket")
+        )
+        for bucket, count in rows:
+            yield bucket.astimezone(zone).replace(tzinfo=None), count
+        lower = upper
+
+
+# Click feed
+# Click ids only grow and SQLite serializes writes, so reading by id range
+# never skips a committed click. The table is stored in id order, so each
+# page is a single range scan.
+FEED_FIELDS = (
+    "id",
+    "url_id",
+    "clicked_at",
+    "ip_address",
+    "user_agent",
+    "referrer",
+    "weight",
+    "destination_id",
+)
+
+
+def click_feed_page(after_id, limit):
+    """Clicks with an id above after_id, oldest first"""
+    return (
+        Click.objects.filter(pk__gt=after_id)
+        .order_by("pk")
+        .values_list(*FEED_FIELDS)[:limit]
+    )
+
+
+def click_feed_rows(after_id, limit, chunk_size=2000):
+    """click_feed_page() read in short keyset queries of chunk_size rows
+
+    Each chunk is fetched in full before its rows are handed on, so a slow
+    consumer never holds a read open that blocks click inserts.
+    """
+    while limit > 0:
+        rows = list(click_feed_page(after_id, min(chunk_size, limit)))
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+        after_id = rows[-1][0]
+        limit -= len(rows)
+
+
+def click_feed_lag(after_id):
+    """Clicks a consumer at after_id is behind (upper bound if some were deleted)"""
+    last_id = Click.objects.aggregate(Max("pk"))["pk__max"] or 0
+    return max(last_id - after_id, 0)
+
+
+def feed_lines(rows):
+    """One compact JSON object per click, newline separated"""
+    for (
+        click_id,
+        url_id,
+        clicked_at,
+        ip,
+        user_agent,
+        referrer,
+        weight,
+        destination_id,
+    ) in rows:
+        event = {
+            "id": click_id,
+            "url": url_id,
+            "t": clicked_at.isoformat(),
+            "ip": ip,
+            "ua": user_agent,
+            "ref": referrer,
+            "w": weight,
+            "dest": destination_id,
+        }
+        yield json.dumps(event, separators=(",", ":")) + "\n"
+
+
+# Click export
+EXPORT_FIELDS = (
+    "id",
+    "clicked_at",
+    "ip_address",
+    "user_agent",
+    "referrer",
+    "weight",
+    "destination_id",
+)
+EXPORT_FORMATS = ("csv", "jsonl")
+
+
+def parse_export_params(params):
+    """Read format, optional start/end, tz and gzip from query params
+
+    Returns (fmt, start, end, compress), start and end may be None.
+    Raises ValueError with a readable message on bad input.
+    """
+    fmt = params.get("format") or "csv"
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+
+    zone = _parse_zone(params)
+    start = _parse_moment(params.get("start"), zone)
+    end = _parse_moment(params.get("end"), zone)
+    if start and end and start >= end:
+        raise ValueError("start must be before end")
+
+    return fmt, start, end, params.get("gzip") in ("1", "true")
+
+
+class _Echo:
+    """File-like object for csv.writer that hands each line back"""
+
+    def write(self, value):
+        return value
+
+
+# Spreadsheets run cells starting with these as formulas
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _csv_cell(value):
+    """Quote client supplied text so a spreadsheet shows it as text"""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def click_export(clicks, fmt, compress=False, start=None, end=None):
+    """Yield a CSV or JSON lines file of some clicks as bytes, oldest first
+
+    Clicks are read in keyset pages on (clicked_at, id), one short query
+    each, so the (url, clicked_at) index serves every page without sorting.
+    A page is encoded (and gzipped) while it is read and only handed on
+    once its query is done, so a slow download never holds a read open.
+    """
+    writer = csv.writer(_Echo())
+    compressor = zlib.compressobj(wbits=31) if compress else None  # gzip
+
+    def encode(text):
+        data = text.encode()
+        return compressor.compress(data) if compressor else data
+
+    if fmt == "csv":
+        yield encode(writer.writerow(EXPORT_FIELDS))
+
+    if end is not None:
+        clicks = clicks.filter(clicked_at__lt=end)
+    page_size = settings.CLICK_EXPORT_PAGE_SIZE
+    last = None
+
+    while True:
+        page = clicks
+        if last is not None:
+            page = page.filter(clicked_at__gte=last[1]).exclude(
+                clicked_at=last[1], pk__lte=last[0]
+            )
+        elif start is not None:
+            page = page.filter(clicked_at__gte=start)
+        rows = page.order_by("clicked_at", "pk").values_list(*EXPORT_FIELDS)
+
+        parts = []
+        count = 0
+        for row in rows[:page_size].iterator(chunk_size=2000):
+            if fmt == "csv":
+                line = writer.writerow(
+                    [row[0], row[1].isoformat(), *map(_csv_cell, row[2:])]
+                )
+            else:
+                event = dict(zip(EXPORT_FIELDS, row))
+                event["clicked_at"] = row[1].isoformat()
+                line = json.dumps(event, separators=(",", ":")) + "\n"
+            parts.append(encode(line))
+            last = row
+            count += 1
+
+        if parts:
+            yield b"".join(parts)
+        if count < page_size:
+            break
+
+    if compressor:
+        yield compressor.flush()
@@ -0,0 +1,20 @@
+from django.urls import path
+
+from . import views
+
+urlpatterns = [
+    path("series/", views.user_click_series, name="user_click_series"),
+    path(
+        "series/<str:short_code>/",
+        views.url_click_series,
+        name="url_click_series",
+    ),
+    path(
+        "export/<str:short_code>/",
+        views.url_click_export,
+        name="url_click_export",
+    ),
+    path("feed/clicks/", views.click_feed, name="click_feed"),
+    path("feed/clicks/commit/", views.click_feed_commit, name="click_feed_commit"),
+    path("feed/status/", views.click_feed_status, name="click_feed_status"),
+]
@@ -1,3 +1,207 @@
-from django.shortcuts import render
+import json
 
-# Create your views here.
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.db import router
+from django.http import (
+    Http404,
+    HttpResponseForbidden,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+
+from shortener.models import Click
+from shortener.services import get_redirect_entry
+from url_shortener.db import read_replica
+
+from .models import FeedConsumer
+from .services import (
+    GRANULARITIES,
+    click_export,
+    click_feed_lag,
+    click_feed_rows,
+    click_series,
+    feed_lines,
+    parse_export_params,
+    parse_series_params,
+)
+
+
+@login_required
+@read_replica
+def user_click_series(request):
+    """Click time series over all of the user's URLs"""
+    # Bound now, a streamed body is read after @read_replica has returned
+    clicks = Click.objects.using(router.db_for_read(Click)).filter(
+        url__user=request.user
+    )
+    return series_response(request, clicks)
+
+
+@login_required
+@read_replica
+def url_click_series(request, short_code):
+    """Click time series for one URL"""
+    entry = get_redirect_entry(short_code)
+    if entry is None:
+        raise Http404("Short URL not found.")
+
+    # Verify ownership
+    if entry["user_id"] != request.user.id:
+        return HttpResponseForbidden("You don't own this URL.")
+
+    # Bound now, a streamed body is read after @read_replica has returned
+    clicks = Click.objects.using(router.db_for_read(Click)).filter(url_id=entry["id"])
+    return series_response(request, clicks)
+
+
+def series_response(request, clicks):
+    try:
+        start, end, granularity, zone = parse_series_params(request.GET)
+    except ValueError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+
+    series = click_series(clicks, start, end, granularity, zone)
+    header = {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "granularity": granularity,
+        "tz": str(zone),
+    }
+
+    # Small ranges in one go, large ones streamed point by point
+    points = (end - start) / GRANULARITIES[granularity]
+    if points <= settings.ANALYTICS_SERIES_STREAM_THRESHOLD:
+        header["series"] = [
+            {"t": bucket.replace(tzinfo=zone).isoformat(), "clicks": count}
+            for bucket, count in series
+        ]
+        return JsonResponse(header)
+
+    return StreamingHttpResponse(
+        stream_series(header, series, zone), content_type="application/json"
+    )
+
+
+def stream_series(header, series, zone):
+    """Write the same JSON document as JsonResponse, one point at a time"""
+    yield json.dumps(header)[:-1] + ', "series": ['
+
+    separator = ""
+    for bucket, count in series:
+        point = {"t": bucket.replace(tzinfo=zone).isoformat(), "clicks": count}
+        yield separator + json.dumps(point)
+        separator = ", "
+
+    yield "]}"
+
+
+@login_required
+@read_replica
+@require_GET
+def url_click_export(request, short_code):
+    """Download a URL's full click log as CSV or JSON lines, optionally gzipped"""
+    entry = get_redirect_entry(short_code)
+    if entry is None:
+        raise Http404("Short URL not found.")
+
+    # Verify ownership
+    if entry["user_id"] != request.user.id:
+        return HttpResponseForbidden("You don't own this URL.")
+
+    try:
+        fmt, start, end, compress = parse_export_params(request.GET)
+    except ValueError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+
+    # The body is read after the view returns, outside of @read_replica
+    clicks = Click.objects.using(router.db_for_read(Click)).filter(url_id=entry["id"])
+
+    filename = f"{short_code}-clicks.{fmt}"
+    content_type = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    if compress:
+        filename += ".gz"
+        content_type = "application/gzip"
+
+    response = StreamingHttpResponse(
+        click_export(clicks, fmt, compress, start, end), content_type=content_type
+    )
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+# Click feed for downstream systems, authenticated by consumer token
+def get_feed_consumer(request):
+    auth = request.headers.get("Authorization", "")
+    if not auth.startswith("Bearer "):
+        return None
+    return FeedConsumer.objects.filter(token=auth[len("Bearer ") :]).first()
+
+
+def parse_feed_int(value, default):
+    try:
+        return max(int(value), 0) if value else default
+    except ValueError:
+        return None
+
+
+@require_GET
+def click_feed(request):
+    """Next page of clicks as NDJSON, after ?after= or the committed offset
+
+    Reading doesn't move the offset, consumers commit the last id they
+    processed with click_feed_commit.
+    """
+    consumer = get_feed_consumer(request)
+    if consumer is None:
+        return JsonResponse({"error": "Invalid feed token."}, status=401)
+
+    after = parse_feed_int(request.GET.get("after"), consumer.last_click_id)
+    limit = parse_feed_int(request.GET.get("limit"), settings.CLICK_FEED_PAGE_SIZE)
+    if after is None or limit is None:
+        return JsonResponse({"error": "after and limit must be numbers."}, status=400)
+    limit = min(limit, settings.CLICK_FEED_MAX_PAGE_SIZE)
+
+    rows = click_feed_rows(after, limit)
+    response = StreamingHttpResponse(
+        feed_lines(rows), content_type="application/x-ndjson"
+    )
+    response["X-Feed-Lag"] = click_feed_lag(after)
+    return response
+
+
+@csrf_exempt  # Token authenticated, no cookies involved
+@require_POST
+def click_feed_commit(request):
+    """Store the consumer's offset, POST cursor=<last processed click id>"""
+    consumer = get_feed_consumer(request)
+    if consumer is None:
+        return JsonResponse({"error": "Invalid feed token."}, status=401)
+
+    cursor = parse_feed_int(request.POST.get("cursor"), None)
+    if cursor is None:
+        return JsonResponse({"error": "cursor must be a number."}, status=400)
+
+    FeedConsumer.objects.filter(pk=consumer.pk).update(
+        last_click_id=cursor, updated_at=timezone.now()
+    )
+    return JsonResponse({"cursor": cursor, "lag": click_feed_lag(cursor)})
+
+
+@require_GET
+def click_feed_status(request):
+    consumer = get_feed_consumer(request)
+    if consumer is None:
+        return JsonResponse({"error": "Invalid feed token."}, status=401)
+
+    return JsonResponse(
+        {
+            "consumer": consumer.name,
+            "cursor": consumer.last_click_id,
+            "lag": click_feed_lag(consumer.last_click_id),
+            "updated_at": consumer.updated_at.isoformat(),
+        }
+    )
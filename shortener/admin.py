@@ -1,3 +1,185 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.contrib.auth import get_user_model
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.functional import cached_property
 
-# Register your models here.
+from .models import URL, Click, Destination
+from .services import bump_cache_versions, evict_redirect_cache
+
+# Rows per UPDATE/DELETE statement in bulk actions
+BATCH_SIZE = 1000
+
+
+def estimate_row_count(model):
+    """Approximate row count of a table without scanning it"""
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE relname = %s",
+                [model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        return max(row[0], 0) if row else 0
+
+    # Ids only grow, so the largest one is a cheap upper bound (index lookup)
+    return model.objects.aggregate(Max("pk"))["pk__max"] or 0
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that never counts more than `threshold` rows
+
+    Large unfiltered changelists get an estimate. Filtered or searched lists
+    count at most `threshold` matches, pages past that aren't listed and
+    the filter has to be narrowed instead.
+    """
+
+    threshold = 100_000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimate_row_count(queryset.model)
+            if estimate >= self.threshold:
+                return estimate
+            return super().count
+        # COUNT(*) over a LIMIT subquery, stops after threshold rows
+        return queryset.order_by()[: self.threshold].count()
+
+
+def batched_rows(queryset, *fields, batch_size=BATCH_SIZE):
+    """Yield lists of (pk, *fields) in primary key order, one query per batch"""
+    last_pk = 0
+    while True:
+        rows = list(
+            queryset.filter(pk__gt=last_pk)
+            .order_by("pk")
+            .values_list("pk", *fields)[:batch_size]
+        )
+        if not rows:
+            return
+        yield rows
+        last_pk = rows[-1][0]
+
+
+def purge_clicks(url_ids, batch_size=BATCH_SIZE):
+    """Delete the clicks of some URLs, a batch of rows per DELETE"""
+    clicks = Click.objects.filter(url_id__in=url_ids).order_by()
+    deleted = 0
+    while True:
+        pks = list(clicks.values_list("pk", flat=True)[:batch_size])
+        if not pks:
+            return deleted
+        deleted += Click.objects.filter(pk__in=pks).delete()[0]
+
+
+class URLActionForm(ActionForm):
+    username = forms.CharField(
+        required=False, label="New owner (for reassign)", max_length=150
+    )
+
+
+class DestinationInline(admin.TabularInline):
+    model = Destination
+    extra = 0
+
+
+@admin.register(URL)
+class URLAdmin(admin.ModelAdmin):
+    list_display = (
+        "short_code",
+        "original_url",
+        "user",
+        "click_count",
+        "created_at",
+        "expiration_date",
+        "is_active",
+    )
+    list_select_related = ("user",)
+    # Only indexed columns, each filter page is an index range scan
+    list_filter = ("is_active",)
+    # Exact match only, served by the short_code index
+    search_fields = ("=short_code",)
+    # Primary key order keeps deep pages cheap
+    ordering = ("-id",)
+    autocomplete_fields = ("user",)
+    readonly_fields = ("click_count", "created_at", "updated_at")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    inlines = (DestinationInline,)
+    action_form = URLActionForm
+    actions = ("expire_urls", "reassign_urls", "purge_url_clicks")
+
+    def save_related(self, request, form, formsets, change):
+        # Destinations are saved here, after the URL itself
+        super().save_related(request, form, formsets, change)
+        obj = form.instance
+        evict_redirect_cache(obj.short_code)
+        bump_cache_versions(user_id=obj.user_id, url_id=obj.id)
+
+    def delete_model(self, request, obj):
+        url_id = obj.id
+        super().delete_model(request, obj)
+        evict_redirect_cache(obj.short_code)
+        bump_cache_versions(user_id=obj.user_id, url_id=url_id)
+
+    def delete_queryset(self, request, queryset):
+        # The default action deletes selected rows in one go as well
+        rows = list(queryset.values_list("pk", "short_code", "user_id"))
+        super().delete_queryset(request, queryset)
+        evict_redirect_cache(*(code for _, code, _ in rows))
+        for pk, _, user_id in rows:
+            bump_cache_versions(user_id=user_id, url_id=pk)
+
+    @admin.action(description="Expire selected URLs now")
+    def expire_urls(self, request, queryset):
+        now = timezone.now()
+        total = 0
+        for rows in batched_rows(queryset, "short_code", "user_id"):
+            URL.objects.filter(pk__in=[pk for pk, _, _ in rows]).update(
+                expiration_date=now
+            )
+            evict_redirect_cache(*(code for _, code, _ in rows))
+            for pk, _, user_id in rows:
+                bump_cache_versions(user_id=user_id, url_id=pk)
+            total += len(rows)
+        self.message_user(request, f"Expired {total} URL(s).", messages.SUCCESS)
+
+    @admin.action(description="Reassign selected URLs to another user")
+    def reassign_urls(self, request, queryset):
+        username = request.POST.get("username", "").strip()
+        owner = get_user_model().objects.filter(username=username).first()
+        if owner is None:
+            self.message_user(request, f"No user named '{username}'.", messages.ERROR)
+            return
+
+        total = 0
+        for rows in batched_rows(queryset, "short_code", "user_id"):
+            URL.objects.filter(pk__in=[pk for pk, _, _ in rows]).update(user=owner)
+            evict_redirect_cache(*(code for _, code, _ in rows))
+            for pk, _, user_id in rows:
+                bump_cache_versions(user_id=user_id, url_id=pk)
+            total += len(rows)
+
+        bump_cache_versions(user_id=owner.id)
+        self.message_user(
+            request, f"Reassigned {total} URL(s) to {owner}.", messages.SUCCESS
+        )
+
+    @admin.action(description="Purge clicks of selected URLs")
+    def purge_url_clicks(self, request, queryset):
+        deleted = 0
+        for rows in batched_rows(queryset, "user_id"):
+            url_ids = [pk for pk, _ in rows]
+            deleted += purge_clicks(url_ids)
+            URL.objects.filter(pk__in=url_ids).update(
+                click_count=0, has_sampled_clicks=False
+            )
+            for pk, user_id in rows:
+                bump_cache_versions(user_id=user_id, url_id=pk)
+        self.message_user(request, f"Deleted {deleted} click(s).", messages.SUCCESS)
@@ -1,5 +1,20 @@
 from django.apps import AppConfig
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
+
+from url_shortener.db import configure_sqlite
+
+
+def restore_search_triggers(sender, using, **kwargs):
+    from .search import ensure_search_triggers
+
+    ensure_search_triggers(connections[using])
 
 
 class ShortenerConfig(AppConfig):
     name = "shortener"
+
+    def ready(self):
+        post_migrate.connect(restore_search_triggers, sender=self)
+        connection_created.connect(configure_sqlite)
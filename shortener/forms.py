@@ -2,7 +2,7 @@ from django import forms
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm
 from django.conf import settings
-from .models import URL
+from .models import URL, Destination
 
 
 class UserRegisterForm(UserCreationForm):
@@ -50,3 +50,40 @@ class URLForm(forms.ModelForm):
             if not code.isalnum():
                 raise forms.ValidationError("OOnly letters and numbers allowed.")
         return code
+
+
+class URLEditForm(forms.ModelForm):
+    class Meta:
+        model = URL
+        fields = [
+            "original_url",
+            "redirect_type",
+            "cache_max_age",
+            "beacon_sample_rate",
+            "adaptive_sampling",
+        ]
+        widgets = {
+            "original_url": forms.URLInput(attrs={"class": "form-control"}),
+        }
+
+    def clean(self):
+        cleaned_data = super().clean()
+        # Beacons only make sense when the redirect itself is cached for good
+        if (
+            cleaned_data.get("beacon_sample_rate")
+            and cleaned_data.get("redirect_type") != URL.RedirectType.PERMANENT
+        ):
+            self.add_error(
+                "beacon_sample_rate", "Click beacons need a permanent redirect."
+            )
+        return cleaned_data
+
+
+# Weighted destinations of a split link, edited alongside the URL
+DestinationFormSet = forms.inlineformset_factory(
+    URL,
+    Destination,
+    fields=["target_url", "weight", "label"],
+    extra=1,
+    can_delete=True,
+)
@@ -0,0 +1,108 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Max
+
+from shortener.models import URL
+from shortener.reconcile import init_worker, reconcile_range
+
+
+class Command(BaseCommand):
+    help = "Recompute URL.click_count from Click rows in parallel id ranges"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count(),
+            help="Worker processes, each with its own DB connection",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=10_000,
+            help="URL ids per range (default: 10000)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Corrections per UPDATE statement (default: 500)",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            help="JSON file recording finished ranges, to resume an interrupted run",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report drift without writing corrections",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        checkpoint = Path(options["checkpoint"]) if options["checkpoint"] else None
+
+        state = {"chunk_size": chunk_size, "done": []}
+        if checkpoint and checkpoint.exists():
+            state = json.loads(checkpoint.read_text())
+            if state["chunk_size"] != chunk_size:
+                raise CommandError(
+                    f"Checkpoint was written with --chunk-size {state['chunk_size']}."
+                )
+        done = {start for start, _ in state["done"]}
+
+        max_id = URL.objects.aggregate(Max("pk"))["pk__max"] or 0
+        ranges = [
+            (start, start + chunk_size)
+            for start in range(0, max_id + 1, chunk_size)
+            if start not in done
+        ]
+        self.stdout.write(f"{len(ranges)} range(s) to check, {len(done)} already done.")
+
+        # Workers must not inherit this process's open connections
+        connections.close_all()
+
+        checked = drifted = total_drift = max_drift = 0
+        started = time.monotonic()
+        with ProcessPoolExecutor(
+            max_workers=options["workers"], initializer=init_worker
+        ) as pool:
+            futures = [
+                pool.submit(
+                    reconcile_range,
+                    start,
+                    end,
+                    options["dry_run"],
+                    options["batch_size"],
+                )
+                for start, end in ranges
+            ]
+            for future in as_completed(futures):
+                start, end, n_checked, n_drifted, drift, biggest = future.result()
+                checked += n_checked
+                drifted += n_drifted
+                total_drift += drift
+                max_drift = max(max_drift, biggest)
+
+                if checkpoint and not options["dry_run"]:
+                    state["done"].append([start, end])
+                    checkpoint.write_text(json.dumps(state))
+
+        elapsed = time.monotonic() - started
+        rate = checked / elapsed if elapsed else 0
+        action = "Found" if options["dry_run"] else "Fixed"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Checked {checked} URL(s) in {elapsed:.1f}s ({rate:.0f} URLs/s). "
+                f"{action} {drifted} drifted URL(s), total drift {total_drift} "
+                f"click(s), largest {max_drift}."
+            )
+        )
+        if checkpoint and not options["dry_run"]:
+            checkpoint.unlink()
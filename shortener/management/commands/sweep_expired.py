@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shortener.services import sweep_expired_urls
+
+
+class Command(BaseCommand):
+    help = "Deactivate expired URLs and evict them from the redirect cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="URLs handled per UPDATE/DELETE (default: 500)",
+        )
+        parser.add_argument(
+            "--delete",
+            action="store_true",
+            help="Delete expired URLs and their clicks instead of deactivating them",
+        )
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=0,
+            help="Keep running and sweep every N seconds (default: run once)",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            swept = sweep_expired_urls(
+                batch_size=options["batch_size"], delete=options["delete"]
+            )
+            action = "Deleted" if options["delete"] else "Deactivated"
+            self.stdout.write(f"{action} {swept} expired URL(s).")
+
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
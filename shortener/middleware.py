@@ -0,0 +1,111 @@
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+from .utils import get_client_ip
+
+
+def take_token(cache, key, rate, burst):
+    """Take one token from a bucket, return seconds to wait (0 if allowed)
+
+    Buckets are stored as (tokens, timestamp) and refilled lazily on access.
+    The read and write are not atomic, so concurrent requests may overdraw
+    a bucket slightly, which is fine for abuse protection.
+    """
+    now = time.time()
+    tokens, stamp = cache.get(key) or (burst, now)
+    tokens = min(burst, tokens + (now - stamp) * rate)
+
+    if tokens < 1:
+        return (1 - tokens) / rate
+
+    # Expire once the bucket would be full again anyway
+    cache.set(key, (tokens - 1, now), math.ceil(burst / rate))
+    return 0
+
+
+class LocalBuckets:
+    """In-process bucket store, much faster than a cache backend
+
+    Shared by all threads of one process, writes hold a lock. Expired
+    buckets are pruned only when the store is full, then the least recently
+    updated ones go first.
+    """
+
+    def __init__(self, max_size=100_000):
+        self.buckets = {}
+        self.max_size = max_size
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        item = self.buckets.get(key)
+        if item is None or item[1] < time.time():
+            return None
+        return item[0]
+
+    def set(self, key, value, timeout):
+        with self.lock:
+            if len(self.buckets) >= self.max_size and key not in self.buckets:
+                self.prune()
+            # Re-insert, so dict order is the order of the last update
+            self.buckets.pop(key, None)
+            self.buckets[key] = (value, time.time() + timeout)
+
+    def prune(self):
+        """Drop expired buckets, then the oldest ones down to 90% full
+
+        Called with the lock held.
+        """
+        now = time.time()
+        self.buckets = {k: v for k, v in self.buckets.items() if v[1] >= now}
+        excess = len(self.buckets) - self.max_size * 9 // 10
+        if excess > 0:
+            # Still full of live buckets, drop the oldest tenth
+            for key in list(self.buckets)[:excess]:
+                del self.buckets[key]
+
+
+class RateLimitMiddleware:
+    """Token-bucket rate limiting for the routes listed in RATELIMIT_POLICIES
+
+    Runs in process_view, after URL resolution but before the view, so
+    rejected requests never reach the ORM. Buckets are keyed on the client
+    IP and, for per-user policies, on the session cookie, which identifies a
+    logged in user without loading the session or user from the database.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.policies = settings.RATELIMIT_POLICIES
+        alias = settings.RATELIMIT_CACHE_ALIAS
+        self.cache = caches[alias] if alias else LocalBuckets()
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        url_name = request.resolver_match.url_name
+        policy = self.policies.get(url_name)
+        if policy is None:
+            return None
+        if "methods" in policy and request.method not in policy["methods"]:
+            return None
+
+        rate, burst = policy["rate"], policy["burst"]
+        keys = [f"ratelimit:{url_name}:ip:{get_client_ip(request)}"]
+        session_key = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+        if policy.get("per_user") and session_key:
+            keys.append(f"ratelimit:{url_name}:session:{session_key}")
+
+        for key in keys:
+            wait = take_token(self.cache, key, rate, burst)
+            if wait:
+                response = HttpResponse("Too many requests.", status=429)
+                response["Retry-After"] = str(math.ceil(wait))
+                return response
+
+        return None
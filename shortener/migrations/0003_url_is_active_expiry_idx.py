@@ -0,0 +1,30 @@
+# Generated by Django 6.0.1 on 2026-10-19 19:56
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shortener", "0002_alter_url_user"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="url",
+            name="is_active",
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddIndex(
+            model_name="url",
+            index=models.Index(
+                condition=models.Q(
+                    ("expiration_date__isnull", False), ("is_active", True)
+                ),
+                fields=["expiration_date"],
+                name="shortener_url_live_expiry_idx",
+            ),
+        ),
+    ]
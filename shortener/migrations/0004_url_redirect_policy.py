@@ -0,0 +1,52 @@
+# Generated by Django 6.0.1 on 2026-10-19 19:59
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shortener", "0003_url_is_active_expiry_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="click",
+            name="weight",
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name="url",
+            name="beacon_sample_rate",
+            field=models.FloatField(
+                default=0,
+                help_text="Permanent links only: share of visits that report a click beacon, used to estimate clicks (0 = off).",
+                validators=[
+                    django.core.validators.MinValueValidator(0),
+                    django.core.validators.MaxValueValidator(1),
+                ],
+            ),
+        ),
+        migrations.AddField(
+            model_name="url",
+            name="cache_max_age",
+            field=models.PositiveIntegerField(
+                default=0,
+                help_text="Seconds browsers and CDNs may cache the redirect (0 = default for permanent links).",
+            ),
+        ),
+        migrations.AddField(
+            model_name="url",
+            name="redirect_type",
+            field=models.CharField(
+                choices=[
+                    ("permanent", "Permanent (301, cached)"),
+                    ("temporary", "Temporary (302, cached for max-age)"),
+                    ("no_cache", "Temporary (302, never cached)"),
+                ],
+                default="no_cache",
+                max_length=10,
+            ),
+        ),
+    ]
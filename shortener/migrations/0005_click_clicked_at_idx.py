@@ -0,0 +1,19 @@
+# Generated by Django 6.0.1 on 2026-10-19 20:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shortener", "0004_url_redirect_policy"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="click",
+            index=models.Index(
+                fields=["clicked_at"], name="shortener_c_clicked_5992aa_idx"
+            ),
+        ),
+    ]
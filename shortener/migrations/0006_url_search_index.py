@@ -0,0 +1,103 @@
+# Generated by Django 6.0.1 on 2026-10-19 20:10
+
+from django.db import migrations
+
+# The statements are copied from shortener/search.py as of this migration,
+# so later edits there don't change what it does
+
+SQLITE_CREATE_INDEX = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS shortener_url_fts
+    USING fts5(owner, short_code, original_url, content='', prefix='2 3')
+    """,
+    "INSERT INTO shortener_url_fts(shortener_url_fts, rank) "
+    "VALUES ('rank', 'bm25(0.0, 2.0, 1.0)')",
+    """
+    INSERT INTO shortener_url_fts(rowid, owner, short_code, original_url)
+    SELECT id, 'u' || coalesce(user_id, 0), short_code, original_url
+    FROM shortener_url
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS shortener_url_fts_ai AFTER INSERT ON shortener_url
+    BEGIN
+        INSERT INTO shortener_url_fts(rowid, owner, short_code, original_url)
+        VALUES (new.id, 'u' || coalesce(new.user_id, 0), new.short_code,
+                new.original_url);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS shortener_url_fts_ad AFTER DELETE ON shortener_url
+    BEGIN
+        INSERT INTO shortener_url_fts(shortener_url_fts, rowid, owner, short_code,
+                                      original_url)
+        VALUES ('delete', old.id, 'u' || coalesce(old.user_id, 0), old.short_code,
+                old.original_url);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS shortener_url_fts_au
+    AFTER UPDATE OF user_id, short_code, original_url ON shortener_url
+    BEGIN
+        INSERT INTO shortener_url_fts(shortener_url_fts, rowid, owner, short_code,
+                                      original_url)
+        VALUES ('delete', old.id, 'u' || coalesce(old.user_id, 0), old.short_code,
+                old.original_url);
+        INSERT INTO shortener_url_fts(rowid, owner, short_code, original_url)
+        VALUES (new.id, 'u' || coalesce(new.user_id, 0), new.short_code,
+                new.original_url);
+    END
+    """,
+]
+
+SQLITE_DROP_INDEX = [
+    "DROP TRIGGER IF EXISTS shortener_url_fts_ai",
+    "DROP TRIGGER IF EXISTS shortener_url_fts_ad",
+    "DROP TRIGGER IF EXISTS shortener_url_fts_au",
+    "DROP TABLE IF EXISTS shortener_url_fts",
+]
+
+POSTGRES_CREATE_INDEX = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS shortener_url_original_url_trgm "
+    "ON shortener_url USING gin (original_url gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS shortener_url_short_code_trgm "
+    "ON shortener_url USING gin (short_code gin_trgm_ops)",
+]
+
+POSTGRES_DROP_INDEX = [
+    "DROP INDEX IF EXISTS shortener_url_original_url_trgm",
+    "DROP INDEX IF EXISTS shortener_url_short_code_trgm",
+]
+
+
+def run(schema_editor, statements):
+    with schema_editor.connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def forwards(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        run(schema_editor, SQLITE_CREATE_INDEX)
+    elif vendor == "postgresql":
+        run(schema_editor, POSTGRES_CREATE_INDEX)
+
+
+def backwards(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        run(schema_editor, SQLITE_DROP_INDEX)
+    elif vendor == "postgresql":
+        run(schema_editor, POSTGRES_DROP_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shortener", "0005_click_clicked_at_idx"),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
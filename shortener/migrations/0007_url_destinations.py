@@ -0,0 +1,50 @@
+# Generated by Django 6.0.1 on 2026-10-19 20:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shortener", "0006_url_search_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Destination",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("target_url", models.URLField(max_length=2000)),
+                ("weight", models.PositiveIntegerField(default=1)),
+                ("label", models.CharField(blank=True, max_length=50)),
+                (
+                    "url",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="destinations",
+                        to="shortener.url",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="click",
+            name="destination",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="clicks",
+                to="shortener.destination",
+            ),
+        ),
+    ]
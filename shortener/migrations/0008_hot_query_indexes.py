@@ -0,0 +1,27 @@
+# Generated by Django 6.0.1 on 2026-10-19 20:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shortener", "0007_url_destinations"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="click",
+            index=models.Index(
+                fields=["url", "clicked_at"], name="shortener_click_url_time_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="url",
+            index=models.Index(
+                fields=["user", "-created_at"], name="shortener_url_user_created_idx"
+            ),
+        ),
+    ]
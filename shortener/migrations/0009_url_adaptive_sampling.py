@@ -0,0 +1,21 @@
+# Generated by Django 6.0.1 on 2026-10-19 20:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shortener", "0008_hot_query_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="url",
+            name="adaptive_sampling",
+            field=models.BooleanField(
+                default=False,
+                help_text="Store only a weighted sample of click details while the link is very busy. The click count stays exact.",
+            ),
+        ),
+    ]
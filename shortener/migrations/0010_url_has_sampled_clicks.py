@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-19 20:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shortener", "0009_url_adaptive_sampling"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="url",
+            name="has_sampled_clicks",
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
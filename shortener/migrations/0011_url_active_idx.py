@@ -0,0 +1,31 @@
+# Generated by Django 6.0.1 on 2026-10-19 20:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shortener", "0010_url_has_sampled_clicks"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="url",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["-id"],
+                name="shortener_url_active_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="url",
+            index=models.Index(
+                condition=models.Q(("is_active", False)),
+                fields=["-id"],
+                name="shortener_url_inactive_idx",
+            ),
+        ),
+    ]
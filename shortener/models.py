@@ -1,10 +1,16 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.conf import settings
 from django.utils import timezone
 
 
 class URL(models.Model):
+    class RedirectType(models.TextChoices):
+        PERMANENT = "permanent", "Permanent (301, cached)"
+        TEMPORARY = "temporary", "Temporary (302, cached for max-age)"
+        NO_CACHE = "no_cache", "Temporary (302, never cached)"
+
     original_url = models.URLField(max_length=2000)
     short_code = models.CharField(max_length=15, unique=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -22,10 +28,59 @@ class URL(models.Model):
     custom_code = models.BooleanField(default=False)
     expiration_date = models.DateTimeField(null=True, blank=True)
 
+    # Cleared by the expiry sweeper (soft delete), clicks are kept
+    is_active = models.BooleanField(default=True)
+
+    # HTTP caching of the redirect itself
+    redirect_type = models.CharField(
+        max_length=10, choices=RedirectType.choices, default=RedirectType.NO_CACHE
+    )
+    cache_max_age = models.PositiveIntegerField(
+        default=0,
+        help_text="Seconds browsers and CDNs may cache the redirect "
+        "(0 = default for permanent links).",
+    )
+    beacon_sample_rate = models.FloatField(
+        default=0,
+        validators=[MinValueValidator(0), MaxValueValidator(1)],
+        help_text="Permanent links only: share of visits that report a click "
+        "beacon, used to estimate clicks (0 = off).",
+    )
+    adaptive_sampling = models.BooleanField(
+        default=False,
+        help_text="Store only a weighted sample of click details while the link "
+        "is very busy. The click count stays exact.",
+    )
+    # Set once a sampled click is stored, the Click rows are estimates from then on
+    has_sampled_clicks = models.BooleanField(default=False, editable=False)
+
     class Meta:
         ordering = ["-created_at"]
         indexes = [
             models.Index(fields=["short_code"]),
+            # Admin is_active filter, listed newest id first. Partial, because
+            # boolean filters are bare "WHERE is_active" that SQLite can't
+            # match to a column index
+            models.Index(
+                fields=["-id"],
+                name="shortener_url_active_idx",
+                condition=models.Q(is_active=True),
+            ),
+            models.Index(
+                fields=["-id"],
+                name="shortener_url_inactive_idx",
+                condition=models.Q(is_active=False),
+            ),
+            # Dashboard listing, a user's URLs newest first
+            models.Index(
+                fields=["user", "-created_at"], name="shortener_url_user_created_idx"
+            ),
+            # Only live links with an expiry, so the sweeper never rescans old rows
+            models.Index(
+                fields=["expiration_date"],
+                name="shortener_url_live_expiry_idx",
+                condition=models.Q(is_active=True, expiration_date__isnull=False),
+            ),
         ]
 
     def __str__(self):
@@ -37,15 +92,46 @@ class URL(models.Model):
         return False
 
 
+class Destination(models.Model):
+    """One of several weighted targets a short link splits its traffic across"""
+
+    url = models.ForeignKey(URL, on_delete=models.CASCADE, related_name="destinations")
+    target_url = models.URLField(max_length=2000)
+    # Relative share of traffic, 0 pauses the destination
+    weight = models.PositiveIntegerField(default=1)
+    label = models.CharField(max_length=50, blank=True)
+
+    def __str__(self):
+        return self.label or self.target_url[:50]
+
+
 class Click(models.Model):
     url = models.ForeignKey(URL, on_delete=models.CASCADE, related_name="clicks")
     clicked_at = models.DateTimeField(auto_now_add=True)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     user_agent = models.CharField(max_length=300, blank=True)
     referrer = models.URLField(max_length=2000, blank=True)
+    # Number of clicks this row stands for (> 1 for sampled beacons)
+    weight = models.PositiveIntegerField(default=1)
+    # Destination picked for split links, None otherwise
+    destination = models.ForeignKey(
+        Destination,
+        on_delete=models.SET_NULL,
+        related_name="clicks",
+        null=True,
+        blank=True,
+    )
 
     class Meta:
         ordering = ["-clicked_at"]
+        indexes = [
+            # Date filter in the admin
+            models.Index(fields=["clicked_at"]),
+            # Analytics, a URL's clicks within a time range
+            models.Index(
+                fields=["url", "clicked_at"], name="shortener_click_url_time_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"Click on {self.url.short_code} at {self.clicked_at}"
@@ -0,0 +1,79 @@
+"""Worker side of the reconcile_clicks command
+
+Runs in pool processes, so models are imported inside the functions, after
+init_worker() has set Django up.
+"""
+
+import os
+
+import django
+from django.db import connections
+
+
+def init_worker():
+    """Give each worker process its own Django setup and DB connections"""
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "url_shortener.settings")
+    django.setup()
+    # Connections inherited through fork must not be shared with the parent
+    connections.close_all()
+
+
+def reconcile_range(start_id, end_id, dry_run=False, batch_size=500):
+    """Fix click_count for URLs with start_id <= id < end_id
+
+    click_count should equal the summed weight of the URL's Click rows.
+    Links that ever stored sampled clicks are skipped, their weights are
+    estimates even after adaptive sampling was turned off.
+    Counts and sums come from one SELECT, a consistent snapshot in which
+    record_click()'s UPDATE and INSERT (one transaction) show up together.
+    Drift is corrected by adding the difference, so clicks recorded after
+    the snapshot are kept.
+
+    Returns (start_id, end_id, checked, drifted, total_drift, max_drift).
+    """
+    from django.db.models import Case, Count, F, OuterRef, Subquery, Sum, Value, When
+    from django.db.models.functions import Coalesce
+
+    from .models import URL, Click
+    from .services import bump_cache_versions
+
+    urls = URL.objects.filter(pk__gte=start_id, pk__lt=end_id, has_sampled_clicks=False)
+    click_weights = (
+        Click.objects.filter(url=OuterRef("pk"))
+        .order_by()
+        .values("url")
+        .annotate(total=Sum("weight"))
+        .values("total")
+    )
+    drifted = list(
+        urls.annotate(actual=Coalesce(Subquery(click_weights), 0))
+        .exclude(click_count=F("actual"))
+        .values_list("pk", "user_id", "click_count", "actual")
+    )
+    checked = urls.aggregate(n=Count("pk"))["n"]
+
+    drifts = [actual - count for _, _, count, actual in drifted]
+    if not dry_run:
+        for i in range(0, len(drifted), batch_size):
+            batch = drifted[i : i + batch_size]
+            delta = Case(
+                *(
+                    When(pk=pk, then=Value(actual - count))
+                    for pk, _, count, actual in batch
+                ),
+                default=Value(0),
+            )
+            URL.objects.filter(pk__in=[row[0] for row in batch]).update(
+                click_count=F("click_count") + delta
+            )
+            for pk, user_id, _, _ in batch:
+                bump_cache_versions(user_id=user_id, url_id=pk)
+
+    return (
+        start_id,
+        end_id,
+        checked,
+        len(drifted),
+        sum(abs(drift) for drift in drifts),
+        max((abs(drift) for drift in drifts), default=0),
+    )
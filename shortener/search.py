@@ -0,0 +1,192 @@
+import base64
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import URL
+
+SEARCH_PAGE_SIZE = 20
+
+# SQLite: contentless FTS5 index over short_code/original_url, with the
+# owner stored as a token ("u42") so a user's matches come straight from
+# the index instead of being filtered after the join.
+FTS_TABLE = "shortener_url_fts"
+
+SQLITE_CREATE_INDEX = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE}
+    USING fts5(owner, short_code, original_url, content='', prefix='2 3')
+    """,
+    # Rank by short_code before original_url, ignore the owner column
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES ('rank', 'bm25(0.0, 2.0, 1.0)')",
+    f"""
+    INSERT INTO {FTS_TABLE}(rowid, owner, short_code, original_url)
+    SELECT id, 'u' || coalesce(user_id, 0), short_code, original_url
+    FROM shortener_url
+    """,
+]
+
+# Triggers go away whenever SQLite migrations rebuild shortener_url,
+# so they are (re)created after every migrate as well
+SQLITE_CREATE_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON shortener_url
+    BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, owner, short_code, original_url)
+        VALUES (new.id, 'u' || coalesce(new.user_id, 0), new.short_code,
+                new.original_url);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON shortener_url
+    BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, owner, short_code, original_url)
+        VALUES ('delete', old.id, 'u' || coalesce(old.user_id, 0), old.short_code,
+                old.original_url);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au
+    AFTER UPDATE OF user_id, short_code, original_url ON shortener_url
+    BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, owner, short_code, original_url)
+        VALUES ('delete', old.id, 'u' || coalesce(old.user_id, 0), old.short_code,
+                old.original_url);
+        INSERT INTO {FTS_TABLE}(rowid, owner, short_code, original_url)
+        VALUES (new.id, 'u' || coalesce(new.user_id, 0), new.short_code,
+                new.original_url);
+    END
+    """,
+]
+
+SQLITE_DROP_INDEX = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+# PostgreSQL: trigram indexes make the icontains fallback indexed
+POSTGRES_CREATE_INDEX = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS shortener_url_original_url_trgm "
+    "ON shortener_url USING gin (original_url gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS shortener_url_short_code_trgm "
+    "ON shortener_url USING gin (short_code gin_trgm_ops)",
+]
+
+POSTGRES_DROP_INDEX = [
+    "DROP INDEX IF EXISTS shortener_url_original_url_trgm",
+    "DROP INDEX IF EXISTS shortener_url_short_code_trgm",
+]
+
+
+def _execute(db, statements):
+    with db.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def create_search_index(db):
+    if db.vendor == "sqlite":
+        _execute(db, SQLITE_CREATE_INDEX + SQLITE_CREATE_TRIGGERS)
+    elif db.vendor == "postgresql":
+        _execute(db, POSTGRES_CREATE_INDEX)
+
+
+def drop_search_index(db):
+    if db.vendor == "sqlite":
+        _execute(db, SQLITE_DROP_INDEX)
+    elif db.vendor == "postgresql":
+        _execute(db, POSTGRES_DROP_INDEX)
+
+
+def ensure_search_triggers(db):
+    """Recreate the SQLite sync triggers if the index exists but they don't"""
+    if db.vendor != "sqlite" or FTS_TABLE not in db.introspection.table_names():
+        return
+    _execute(db, SQLITE_CREATE_TRIGGERS)
+
+
+def _encode_cursor(*values):
+    raw = ":".join(repr(value) for value in values)
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(cursor, *types):
+    """Return the cursor values, or None if it was tampered with"""
+    try:
+        values = base64.urlsafe_b64decode(cursor.encode()).decode().split(":")
+        if len(values) != len(types):
+            return None
+        return tuple(cast(value) for cast, value in zip(types, values))
+    except ValueError:
+        return None
+
+
+def search_urls(user, query, cursor=None, limit=SEARCH_PAGE_SIZE):
+    """Search a user's URLs by short code and original URL
+
+    Returns (urls, next_cursor), best matches first. next_cursor is None
+    on the last page.
+
+    On SQLite the cursor is the last (bm25 rank, rowid). bm25 depends on
+    statistics of the whole index, so any insert or edit, by any user,
+    shifts ranks, and a page fetched after one may skip or repeat a few
+    matches of the previous page.
+    """
+    terms = re.findall(r"\w+", query)
+    if not terms:
+        return [], None
+
+    if connection.vendor == "sqlite":
+        return _search_sqlite(user, terms, cursor, limit)
+    return _search_fallback(user, query.strip(), cursor, limit)
+
+
+def _search_sqlite(user, terms, cursor, limit):
+    # Every term as a prefix, all must match one of the two text columns
+    match = 'owner : "u%d" AND {short_code original_url} : (%s)' % (
+        user.id,
+        " ".join(f'"{term}"*' for term in terms),
+    )
+    sql = f"SELECT rank, rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s"
+    params = [match]
+
+    after = _decode_cursor(cursor, float, int) if cursor else None
+    if after:
+        sql += " AND (rank, rowid) > (%s, %s)"
+        params += list(after)
+    sql += " ORDER BY rank, rowid LIMIT %s"
+    params.append(limit + 1)
+
+    with connection.cursor() as db_cursor:
+        db_cursor.execute(sql, params)
+        rows = db_cursor.fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(*rows[-1])
+
+    found = URL.objects.in_bulk([url_id for _, url_id in rows])
+    return [found[url_id] for _, url_id in rows if url_id in found], next_cursor
+
+
+def _search_fallback(user, query, cursor, limit):
+    # Newest first, trigram indexes keep icontains fast on PostgreSQL
+    urls = URL.objects.filter(user=user).filter(
+        Q(short_code__icontains=query) | Q(original_url__icontains=query)
+    )
+
+    before = _decode_cursor(cursor, int) if cursor else None
+    if before:
+        urls = urls.filter(pk__lt=before[0])
+
+    urls = list(urls.order_by("-pk")[: limit + 1])
+    next_cursor = None
+    if len(urls) > limit:
+        urls = urls[:limit]
+        next_cursor = _encode_cursor(urls[-1].pk)
+    return urls, next_cursor
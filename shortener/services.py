@@ -0,0 +1,293 @@
+import random
+import time
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db import router, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import URL, Click, Destination
+from .utils import build_alias_table, get_client_ip, pick_alias
+
+
+# Redirect cache
+def redirect_cache_key(short_code):
+    return f"redirect:{short_code}"
+
+
+def get_redirect_entry(short_code):
+    """Return cached redirect data for a short code, or None if it doesn't exist
+
+    Live links are cached only until their expiration date, so a cache hit
+    never needs another expiry check. Split links also carry their
+    destinations and a precomputed alias table for choose_destination().
+    """
+    key = redirect_cache_key(short_code)
+    entry = cache.get(key)
+    if entry is not None:
+        return entry
+
+    # Always the primary, a stale replica row would be served for an hour
+    db = router.db_for_write(URL)
+    url = (
+        URL.objects.using(db)
+        .filter(short_code=short_code)
+        .values(
+            "id",
+            "user_id",
+            "original_url",
+            "expiration_date",
+            "is_active",
+            "redirect_type",
+            "cache_max_age",
+            "beacon_sample_rate",
+            "adaptive_sampling",
+        )
+        .first()
+    )
+    if url is None:
+        return None
+
+    now = timezone.now()
+    expiration_date = url["expiration_date"]
+    expired = not url["is_active"] or (
+        expiration_date is not None and expiration_date <= now
+    )
+
+    timeout = settings.REDIRECT_CACHE_TIMEOUT
+    if not expired and expiration_date is not None:
+        timeout = min(timeout, int((expiration_date - now).total_seconds()))
+
+    destinations = list(
+        Destination.objects.using(db)
+        .filter(url_id=url["id"], weight__gt=0)
+        .order_by("pk")
+        .values_list("id", "target_url", "weight")
+    )
+
+    entry = {
+        "id": url["id"],
+        "user_id": url["user_id"],
+        "original_url": url["original_url"],
+        "expired": expired,
+        "expiration_date": expiration_date,
+        "redirect_type": url["redirect_type"],
+        "cache_max_age": url["cache_max_age"],
+        "beacon_sample_rate": url["beacon_sample_rate"],
+        "adaptive_sampling": url["adaptive_sampling"],
+        "destinations": [(pk, target) for pk, target, _ in destinations],
+        "alias_table": (
+            build_alias_table([weight for _, _, weight in destinations])
+            if destinations
+            else None
+        ),
+    }
+    cache.set(key, entry, timeout)
+    return entry
+
+
+def choose_destination(entry):
+    """Return (destination_id, target_url) for one visit
+
+    destination_id is None for links that don't split their traffic.
+    """
+    if not entry["alias_table"]:
+        return None, entry["original_url"]
+    return entry["destinations"][pick_alias(*entry["alias_table"])]
+
+
+def evict_redirect_cache(*short_codes):
+    """Drop cached redirect data, e.g. after an edit, delete or expiry"""
+    cache.delete_many([redirect_cache_key(code) for code in short_codes])
+
+
+def click_sample_weight(url_id):
+    """N for storing 1 in N clicks of a link, from its clicks per minute
+
+    Counted in the cache per minute. The busier of this and the previous
+    minute is used, so sampling doesn't restart at every full minute.
+    """
+    minute = int(time.time() // 60)
+    key = f"clickrate:{url_id}:{minute}"
+    if cache.add(key, 1, 120):
+        current = 1
+    else:
+        try:
+            current = cache.incr(key)
+        except ValueError:
+            current = 1  # Expired in between
+    previous = cache.get(f"clickrate:{url_id}:{minute - 1}", 0)
+
+    rate = max(current, previous)
+    return max(1, -(-rate // settings.CLICK_SAMPLING_THRESHOLD))
+
+
+# Click beacons
+def beacon_token(short_code, max_age):
+    """Signed token for beacon.html, valid as long as the page is cached
+
+    Anyone who fetched the page can replay it, click_beacon() counts one
+    beacon per client address and link every BEACON_DEDUP_TIMEOUT.
+    """
+    payload = {"code": short_code, "until": int(time.time()) + max_age}
+    return signing.dumps(payload, salt="click_beacon")
+
+
+def check_beacon_token(short_code, token):
+    try:
+        payload = signing.loads(token, salt="click_beacon")
+    except signing.BadSignature:
+        return False
+    return payload.get("code") == short_code and payload.get("until", 0) >= time.time()
+
+
+def sample_weight(rate):
+    """Clicks one sample stands for when sampling with probability `rate`
+
+    Weights are whole numbers, so 1 / rate is rounded up or down at random
+    with matching odds, which makes the average weight exactly 1 / rate.
+    """
+    whole, fraction = divmod(1 / rate, 1)
+    return int(whole) + (random.random() < fraction)
+
+
+def record_click(request, entry, weight=1, referrer=None, destination_id=None):
+    """Count a click (or `weight` estimated clicks) and store its details
+
+    With adaptive sampling a busy link stores each click's details with
+    probability 1/N and weight N, which keeps weighted analytics unbiased.
+    """
+    url_id = entry["id"]
+
+    # Busy links in sampling mode keep 1 in N detail rows, weighted by N
+    sample = click_sample_weight(url_id) if entry["adaptive_sampling"] else 1
+    store = random.random() * sample < 1
+    if referrer is None:
+        referrer = request.META.get("HTTP_REFERER", "")
+
+    # One transaction, so the count and the rows never drift apart
+    with transaction.atomic():
+        # Increment click count (F() prevents race conditions)
+        # Sampled rows are estimates, reconcile_clicks must leave this link be
+        sampled = {"has_sampled_clicks": True} if sample > 1 else {}
+        counted = URL.objects.filter(pk=url_id).update(
+            click_count=F("click_count") + weight, **sampled
+        )
+
+        # No row means the URL was deleted after its entry was cached
+        if counted and store:
+            Click.objects.create(
+                url_id=url_id,
+                ip_address=get_client_ip(request),
+                user_agent=request.META.get("HTTP_USER_AGENT", "")[:300],
+                referrer=referrer[:2000],
+                weight=weight * sample,
+                destination_id=destination_id,
+            )
+
+    # Cached analytics pages of this URL and its owner are stale now
+    bump_click_versions(user_id=entry["user_id"], url_id=url_id)
+
+
+# Versioned page caches
+# Cached pages embed the current version of the user/URL they depend on,
+# bumping the version makes every older entry unreachable.
+def _version_key(kind, obj_id):
+    return f"version:{kind}:{obj_id}"
+
+
+def get_cache_version(kind, obj_id):
+    key = _version_key(kind, obj_id)
+    version = cache.get(key)
+    if version is None:
+        # Start from a unique value so a lost version key can't revive old pages
+        version = time.time_ns()
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_cache_versions(user_id=None, url_id=None):
+    for kind, obj_id in (("user", user_id), ("url", url_id)):
+        if obj_id is None:
+            continue
+        try:
+            cache.incr(_version_key(kind, obj_id))
+        except ValueError:
+            pass  # No version yet, so nothing is cached under it
+
+
+# Next time each URL/user may be bumped for clicks, per process
+_click_bumps = {}
+
+
+def bump_click_versions(user_id=None, url_id=None):
+    """bump_cache_versions() for clicks, once per CLICK_BUMP_INTERVAL at most
+
+    Bumping on every click would keep the pages of busy links and their
+    owners from ever being served from the cache. The process-local check
+    keeps the cache out of most redirects, cache.add() limits the bumps
+    across processes.
+    """
+    interval = settings.CLICK_BUMP_INTERVAL
+    now = time.monotonic()
+    if len(_click_bumps) > 10_000:
+        _click_bumps.clear()
+
+    due = {}
+    for kind, obj_id in (("user", user_id), ("url", url_id)):
+        if obj_id is None or _click_bumps.get((kind, obj_id), 0) > now:
+            continue
+        _click_bumps[kind, obj_id] = now + interval
+        due[kind] = cache.add(f"clickbump:{kind}:{obj_id}", 1, interval)
+
+    if due:
+        bump_cache_versions(
+            user_id=user_id if due.get("user") else None,
+            url_id=url_id if due.get("url") else None,
+        )
+
+
+def user_cache_key(user_id, name, *parts):
+    """Cache key for a page built from all of a user's URLs"""
+    version = get_cache_version("user", user_id)
+    return ":".join(["page", name, str(user_id), str(version), *map(str, parts)])
+
+
+def url_cache_key(url_id, name, *parts):
+    """Cache key for a page built from a single URL and its clicks"""
+    version = get_cache_version("url", url_id)
+    return ":".join(["page", name, str(url_id), str(version), *map(str, parts)])
+
+
+# Expiry sweeper
+def sweep_expired_urls(batch_size=500, delete=False, now=None):
+    """Deactivate (or delete) newly expired URLs in batches
+
+    Returns the number of URLs swept.
+    """
+    now = now or timezone.now()
+    swept = 0
+
+    while True:
+        batch = list(
+            URL.objects.filter(is_active=True, expiration_date__lte=now)
+            .order_by("expiration_date")
+            .values_list("id", "short_code")[:batch_size]
+        )
+        if not batch:
+            break
+
+        ids = [url_id for url_id, _ in batch]
+        if delete:
+            # Clicks go with them (CASCADE)
+            URL.objects.filter(pk__in=ids).delete()
+        else:
+            URL.objects.filter(pk__in=ids).update(is_active=False)
+
+        evict_redirect_cache(*(code for _, code in batch))
+        swept += len(batch)
+
+    return swept
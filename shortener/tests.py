@@ -0,0 +1,712 @@
+import csv
+import gzip
+import json
+import random
+import threading
+import unittest
+from collections import Counter
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Sum
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from analystics.services import (
+    EXPORT_FIELDS,
+    click_export,
+    click_feed_page,
+    click_series,
+)
+from url_shortener.db import ReadReplicaRouter, read_replica
+
+from . import services
+from .middleware import LocalBuckets, take_token
+from .models import URL, Click, Destination
+from .reconcile import reconcile_range
+from .search import search_urls
+from .services import check_beacon_token, sample_weight
+from .utils import build_alias_table, pick_alias
+
+
+def query_plan(sql):
+    """EXPLAIN QUERY PLAN details of one statement, one line per step"""
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+        return [row[-1] for row in cursor.fetchall()]
+
+
+@unittest.skipUnless(connection.vendor == "sqlite", "Plans are SQLite specific")
+class QueryPlanTests(TestCase):
+    """Hot queries must stay index lookups, whatever the models turn into"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user("planner", password="x")
+        cls.url = URL.objects.create(
+            user=cls.user, original_url="https://example.com/", short_code="plan1"
+        )
+        Destination.objects.create(url=cls.url, target_url="https://a.example.com/")
+        Click.objects.create(url=cls.url, ip_address="127.0.0.1")
+
+    def setUp(self):
+        # Cached redirects and pages would hide their queries
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def capture(self, func):
+        """SELECT and UPDATE statements run by func(), after it returned"""
+        with CaptureQueriesContext(connection) as queries:
+            func()
+        statements = [
+            q["sql"] for q in queries if q["sql"].startswith(("SELECT", "UPDATE"))
+        ]
+        self.assertTrue(statements, "No queries captured")
+        return statements
+
+    def get(self, path):
+        """Statements a page runs, the response must render"""
+
+        def request():
+            response = self.client.get(path)
+            self.assertLess(response.status_code, 400)
+
+        return self.capture(request)
+
+    def assertNoTableScans(self, statements):
+        for sql in statements:
+            for step in query_plan(sql):
+                # "SCAN table" reads every row, "SEARCH ... USING INDEX" doesn't.
+                # Scanning a derived table only reads rows found by index.
+                if not step.startswith("SCAN") or "subquery" in step:
+                    continue
+                if "INDEX" not in step and "CONSTANT ROW" not in step:
+                    self.fail(f"Table scan ({step}) in:\n{sql}")
+
+    def assertUsesIndex(self, sql, index):
+        plan = "\n".join(query_plan(sql))
+        self.assertIn(f"INDEX {index}", plan, f"Plan for:\n{sql}\n{plan}")
+
+    def test_redirect(self):
+        statements = self.get("/plan1/")
+        self.assertNoTableScans(statements)
+        # Lookup, destinations and the click_count UPDATE
+        self.assertEqual(len(statements), 3)
+
+    def test_dashboard(self):
+        statements = self.get("/dashboard/")
+        self.assertNoTableScans(statements)
+
+        (page,) = [sql for sql in statements if "ORDER BY" in sql]
+        # Newest first straight from the index, no sort of all the user's URLs
+        self.assertUsesIndex(page, "shortener_url_user_created_idx")
+        self.assertNotIn("TEMP B-TREE", "\n".join(query_plan(page)))
+        self.assertTrue(any("SUM(" in sql for sql in statements))
+
+    def test_user_analytics(self):
+        statements = self.get("/analytics/")
+        self.assertNoTableScans(statements)
+
+        recent = [sql for sql in statements if "shortener_click" in sql]
+        self.assertTrue(recent)
+        for sql in recent:
+            self.assertUsesIndex(sql, "shortener_click_url_time_idx")
+
+    def test_url_analytics(self):
+        statements = self.get("/url/plan1/analytics/")
+        self.assertNoTableScans(statements)
+
+        recent = [sql for sql in statements if "LIMIT 20" in sql]
+        self.assertEqual(len(recent), 1)
+        self.assertUsesIndex(recent[0], "shortener_click_url_time_idx")
+        self.assertNotIn("TEMP B-TREE", "\n".join(query_plan(recent[0])))
+
+    def test_admin_filtered_changelist(self):
+        admin = get_user_model().objects.create_superuser(
+            "planadmin", "planadmin@example.com", "x"
+        )
+        self.client.force_login(admin)
+        for value, index in [(1, "active"), (0, "inactive")]:
+            statements = self.get(f"/admin/shortener/url/?is_active__exact={value}")
+            self.assertNoTableScans(statements)
+
+            (count,) = [sql for sql in statements if "COUNT(" in sql]
+            self.assertIn("LIMIT", count)
+            (page,) = [sql for sql in statements if "ORDER BY" in sql]
+            self.assertUsesIndex(page, f"shortener_url_{index}_idx")
+            self.assertNotIn("TEMP B-TREE", "\n".join(query_plan(page)))
+
+    def test_url_click_series(self):
+        now = timezone.now()
+        clicks = Click.objects.filter(url_id=self.url.id)
+        (sql,) = self.capture(
+            lambda: list(
+                click_series(
+                    clicks,
+                    now - timedelta(days=7),
+                    now,
+                    "day",
+                    timezone.get_current_timezone(),
+                )
+            )
+        )
+        self.assertUsesIndex(sql, "shortener_click_url_time_idx")
+
+    def test_click_feed(self):
+        (sql,) = self.capture(lambda: list(click_feed_page(0, 100)))
+        self.assertIn("PRIMARY KEY", "\n".join(query_plan(sql)))
+
+    @override_settings(CLICK_EXPORT_PAGE_SIZE=1)
+    def test_click_export_pages(self):
+        Click.objects.create(url=self.url, ip_address="127.0.0.2")
+        clicks = Click.objects.filter(url_id=self.url.id)
+        statements = self.capture(lambda: list(click_export(clicks, "csv")))
+        # Every page, including the ones after the first, reads in index order
+        self.assertEqual(len(statements), 3)
+        for sql in statements:
+            self.assertUsesIndex(sql, "shortener_click_url_time_idx")
+            self.assertNotIn("TEMP B-TREE", "\n".join(query_plan(sql)))
+
+
+class TakeTokenTests(SimpleTestCase):
+    def take(self, buckets, now):
+        with mock.patch("shortener.middleware.time.time", return_value=now):
+            return take_token(buckets, "key", rate=2, burst=3)
+
+    def test_burst_then_wait(self):
+        buckets = LocalBuckets()
+        self.assertEqual([self.take(buckets, 100) for _ in range(3)], [0, 0, 0])
+        # Empty bucket, the next token comes in 1 / rate seconds
+        self.assertAlmostEqual(self.take(buckets, 100), 0.5)
+
+    def test_refill(self):
+        buckets = LocalBuckets()
+        for _ in range(3):
+            self.take(buckets, 100)
+        self.assertEqual(self.take(buckets, 100.5), 0)
+        self.assertGreater(self.take(buckets, 100.5), 0)
+        # Never refills above the burst size
+        self.assertEqual([self.take(buckets, 200) for _ in range(3)], [0, 0, 0])
+        self.assertGreater(self.take(buckets, 200), 0)
+
+    def test_full_store_keeps_recent_buckets(self):
+        buckets = LocalBuckets(max_size=10)
+        for i in range(10):
+            buckets.set(f"key{i}", i, 60)
+        buckets.set("new", 10, 60)
+        self.assertIsNone(buckets.get("key0"))
+        self.assertEqual(buckets.get("key9"), 9)
+        self.assertEqual(buckets.get("new"), 10)
+
+    def test_full_store_shared_by_threads(self):
+        buckets = LocalBuckets(max_size=2000)
+        errors = []
+
+        def hammer(thread):
+            try:
+                for i in range(20_000):
+                    take_token(buckets, f"{thread}:{i}", rate=2, burst=3)
+            except Exception as exc:
+                errors.append(exc)
+
+        threads = [threading.Thread(target=hammer, args=(n,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertLessEqual(len(buckets.buckets), 2000)
+
+
+@override_settings(RATELIMIT_POLICIES={"redirect": {"rate": 0.001, "burst": 2}})
+class RateLimitMiddlewareTests(TestCase):
+    # Each test's client loads the middleware, and its buckets, afresh
+    def test_429_with_retry_after(self):
+        statuses = [self.client.get("/nope/").status_code for _ in range(3)]
+        self.assertEqual(statuses, [404, 404, 429])
+
+        response = self.client.get("/nope/")
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response["Retry-After"]), 0)
+
+    def test_forged_forwarded_for_is_ignored(self):
+        statuses = [
+            self.client.get("/nope/", HTTP_X_FORWARDED_FOR=f"10.0.0.{i}").status_code
+            for i in range(3)
+        ]
+        self.assertEqual(statuses[-1], 429)
+
+    @override_settings(TRUSTED_PROXY_HOPS=1)
+    def test_trusted_proxy_address(self):
+        def get(forwarded):
+            return self.client.get("/nope/", HTTP_X_FORWARDED_FOR=forwarded)
+
+        # The client can prepend anything, only the proxy's entry counts
+        statuses = [get(f"10.0.0.{i}, 203.0.113.7").status_code for i in range(3)]
+        self.assertEqual(statuses[-1], 429)
+        self.assertEqual(get("203.0.113.8").status_code, 404)
+
+
+class RedirectCachingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.url = URL.objects.create(
+            original_url="https://example.com/",
+            short_code="perm1",
+            redirect_type=URL.RedirectType.PERMANENT,
+            expiration_date=timezone.now() + timedelta(hours=1),
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def max_age(self, response):
+        return int(response["Cache-Control"].split("max-age=")[1].split(",")[0])
+
+    def test_max_age_capped_at_expiry(self):
+        response = self.client.get("/perm1/")
+        self.assertEqual(response.status_code, 301)
+        self.assertTrue(3500 < self.max_age(response) <= 3600)
+
+    def test_temporary_max_age_capped_at_expiry(self):
+        URL.objects.filter(pk=self.url.pk).update(
+            redirect_type=URL.RedirectType.TEMPORARY,
+            cache_max_age=86400,
+            expiration_date=timezone.now() + timedelta(seconds=90),
+        )
+        response = self.client.get("/perm1/")
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(80 < self.max_age(response) <= 90)
+
+    def test_no_cache_when_about_to_expire(self):
+        URL.objects.filter(pk=self.url.pk).update(
+            expiration_date=timezone.now() + timedelta(milliseconds=500)
+        )
+        response = self.client.get("/perm1/")
+        self.assertEqual(response.status_code, 302)
+        self.assertIn("no-store", response["Cache-Control"])
+
+    def test_beacon_needs_token_from_page(self):
+        URL.objects.filter(pk=self.url.pk).update(beacon_sample_rate=0.5)
+        page = self.client.get("/perm1/")
+        token = page.context["beacon_token"]
+
+        self.client.post("/b/perm1/", {"token": "forged"})
+        self.client.post("/b/perm1/")
+        self.assertEqual(Click.objects.filter(url=self.url).count(), 0)
+
+        response = self.client.post("/b/perm1/", {"token": token})
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(Click.objects.get(url=self.url).weight, 2)
+        self.assertFalse(check_beacon_token("other", token))
+
+    def test_replayed_beacon_counts_once(self):
+        URL.objects.filter(pk=self.url.pk).update(beacon_sample_rate=0.01)
+        token = self.client.get("/perm1/").context["beacon_token"]
+        for _ in range(5):
+            self.client.post("/b/perm1/", {"token": token})
+        self.client.post("/b/perm1/", {"token": token}, REMOTE_ADDR="192.0.2.9")
+
+        self.assertEqual(Click.objects.filter(url=self.url).count(), 2)
+        self.url.refresh_from_db()
+        self.assertEqual(self.url.click_count, 200)
+
+    def test_sample_weight_is_unbiased(self):
+        random.seed(1)
+        weights = [sample_weight(0.3) for _ in range(30000)]
+        self.assertEqual(set(weights), {3, 4})
+        self.assertAlmostEqual(sum(weights) / len(weights), 1 / 0.3, places=1)
+
+
+class PageCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user("cached", password="x")
+        cls.url = URL.objects.create(
+            user=cls.user, original_url="https://example.com/", short_code="cache1"
+        )
+
+    def setUp(self):
+        cache.clear()
+        services._click_bumps.clear()
+        self.client.force_login(self.user)
+
+    def test_dashboard_served_from_cache(self):
+        response = self.client.get("/dashboard/")
+        self.assertContains(response, "cache1")
+        # Session and user only
+        with self.assertNumQueries(2):
+            self.client.get("/dashboard/")
+
+    def test_clicks_bump_pages_once_per_interval(self):
+        self.client.get("/dashboard/")
+        self.client.get("/cache1/")
+        self.client.get("/cache1/")
+
+        versions = [services.get_cache_version("user", self.user.id)]
+        self.client.get("/cache1/")
+        versions.append(services.get_cache_version("user", self.user.id))
+        self.assertEqual(versions[0], versions[1])
+
+        # Edits still invalidate right away
+        services.bump_cache_versions(user_id=self.user.id)
+        self.assertEqual(
+            services.get_cache_version("user", self.user.id), versions[0] + 1
+        )
+
+    def test_click_invalidates_dashboard(self):
+        self.client.get("/dashboard/")
+        self.client.get("/cache1/")
+        self.assertContains(self.client.get("/dashboard/"), "Total Clicks: 1")
+
+
+class AliasTableTests(SimpleTestCase):
+    def frequencies(self, weights, draws=100_000):
+        random.seed(2)
+        table = build_alias_table(weights)
+        counts = Counter(pick_alias(*table) for _ in range(draws))
+        return [counts[i] / draws for i in range(len(weights))]
+
+    def test_frequencies_follow_weights(self):
+        for weights in ([1], [3, 1], [1, 1, 1, 7], [5, 2, 2, 1]):
+            total = sum(weights)
+            for share, weight in zip(self.frequencies(weights), weights):
+                self.assertAlmostEqual(share, weight / total, delta=0.01)
+
+    def test_zero_weights_never_picked(self):
+        shares = self.frequencies([0, 4, 0, 1, 0])
+        self.assertEqual([shares[0], shares[2], shares[4]], [0, 0, 0])
+        self.assertAlmostEqual(shares[1], 0.8, delta=0.01)
+
+
+class SplitLinkTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user("splitter", password="x")
+        cls.url = URL.objects.create(
+            user=cls.user, original_url="https://example.com/", short_code="split1"
+        )
+        Destination.objects.create(
+            url=cls.url, target_url="https://a.example.com/", weight=1, label="Left"
+        )
+        Destination.objects.create(
+            url=cls.url, target_url="https://b.example.com/", weight=0, label="Off"
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_redirects_and_analytics(self):
+        for _ in range(3):
+            response = self.client.get("/split1/")
+            self.assertEqual(response["Location"], "https://a.example.com/")
+            self.assertIn("no-store", response["Cache-Control"])
+
+        self.client.force_login(self.user)
+        response = self.client.get("/url/split1/analytics/")
+        self.assertContains(response, "Left")
+        self.assertEqual(
+            [row["click_total"] for row in response.context["destination_clicks"]],
+            [3, 0],
+        )
+
+
+class ClickExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.owner = User.objects.create_user("exporter", "exporter@example.com", "x")
+        cls.other = User.objects.create_user("stranger", "stranger@example.com", "x")
+        cls.url = URL.objects.create(
+            user=cls.owner, original_url="https://example.com/", short_code="exp1"
+        )
+        for i in range(3):
+            Click.objects.create(url=cls.url, referrer=f"https://ref{i}.example/")
+
+    def setUp(self):
+        cache.clear()
+
+    def test_linked_from_analytics_page(self):
+        self.client.force_login(self.owner)
+        response = self.client.get("/url/exp1/analytics/")
+        self.assertContains(response, reverse("url_click_export", args=["exp1"]))
+
+    def test_owner_only(self):
+        self.client.force_login(self.other)
+        response = self.client.get(reverse("url_click_export", args=["exp1"]))
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(CLICK_EXPORT_PAGE_SIZE=2)
+    def test_gzip_jsonl(self):
+        self.client.force_login(self.owner)
+        response = self.client.get(
+            reverse("url_click_export", args=["exp1"]),
+            {"format": "jsonl", "gzip": "1"},
+        )
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        self.assertIn("exp1-clicks.jsonl.gz", response["Content-Disposition"])
+
+        body = gzip.decompress(b"".join(response.streaming_content))
+        events = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual(
+            [event["referrer"] for event in events],
+            [f"https://ref{i}.example/" for i in range(3)],
+        )
+
+    def test_csv_neutralizes_formulas(self):
+        Click.objects.create(
+            url=self.url, user_agent="=HYPERLINK(1)", referrer="@SUM(A1)"
+        )
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse("url_click_export", args=["exp1"]))
+        rows = list(
+            csv.reader(b"".join(response.streaming_content).decode().splitlines())
+        )
+        self.assertEqual(rows[-1][3:5], ["'=HYPERLINK(1)", "'@SUM(A1)"])
+        self.assertEqual(rows[1][4], "https://ref0.example/")
+
+    def test_csv_date_filter(self):
+        self.client.force_login(self.owner)
+        response = self.client.get(
+            reverse("url_click_export", args=["exp1"]),
+            {"start": (timezone.now() + timedelta(days=1)).isoformat()},
+        )
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines, [",".join(EXPORT_FIELDS)])
+
+
+class DeletedURLTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser(
+            "root", "root@example.com", "x"
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def create(self, code):
+        url = URL.objects.create(
+            user=self.admin, original_url="https://example.com/", short_code=code
+        )
+        self.assertEqual(self.client.get(f"/{code}/").status_code, 302)
+        return url
+
+    def test_admin_delete_evicts_redirect(self):
+        url = self.create("gone1")
+        self.client.post(
+            reverse("admin:shortener_url_delete", args=[url.pk]), {"post": "yes"}
+        )
+        self.assertEqual(self.client.get("/gone1/").status_code, 404)
+
+    def test_admin_bulk_delete_evicts_redirect(self):
+        urls = [self.create("gone2"), self.create("gone3")]
+        self.client.post(
+            reverse("admin:shortener_url_changelist"),
+            {
+                "action": "delete_selected",
+                "_selected_action": [url.pk for url in urls],
+                "post": "yes",
+            },
+        )
+        self.assertFalse(URL.objects.exists())
+        self.assertEqual(self.client.get("/gone2/").status_code, 404)
+
+    def test_stale_entry_stores_no_click(self):
+        url = self.create("gone4")
+        # Deleted behind the cache's back, e.g. by another worker
+        URL.objects.filter(pk=url.pk).delete()
+        self.assertEqual(self.client.get("/gone4/").status_code, 302)
+        self.assertFalse(Click.objects.exists())
+
+
+@mock.patch.dict(settings.DATABASES, {"replica": {}})
+class ReadReplicaRouterTests(TestCase):
+    router = ReadReplicaRouter()
+
+    def routed(self, *models):
+        return [self.router.db_for_read(model) for model in models]
+
+    def test_reads_inside_read_replica_views_only(self):
+        models = (URL, Click, get_user_model(), Session)
+        self.assertEqual(self.routed(*models), ["default"] * 4)
+        self.assertEqual(
+            read_replica(self.routed)(*models),
+            ["replica", "replica", "default", "default"],
+        )
+        self.assertEqual(read_replica(self.router.db_for_write)(URL), "default")
+
+    def test_redirect_entry_read_from_primary(self):
+        cache.clear()
+        URL.objects.create(original_url="https://example.com/", short_code="prim1")
+        # "replica" has no connection here, using it would raise
+        entry = read_replica(services.get_redirect_entry)("prim1")
+        self.assertEqual(entry["original_url"], "https://example.com/")
+
+
+@override_settings(CLICK_SAMPLING_THRESHOLD=10)
+class AdaptiveSamplingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.url = URL.objects.create(
+            original_url="https://example.com/",
+            short_code="busy1",
+            adaptive_sampling=True,
+        )
+
+    def setUp(self):
+        cache.clear()
+        random.seed(3)
+
+    def click(self, times):
+        request = RequestFactory().get("/busy1/", REMOTE_ADDR="192.0.2.1")
+        entry = services.get_redirect_entry("busy1")
+        for _ in range(times):
+            services.record_click(request, entry)
+
+    def test_sample_weight_follows_clicks_per_minute(self):
+        with mock.patch("shortener.services.time.time", return_value=6000):
+            weights = [services.click_sample_weight(self.url.pk) for _ in range(25)]
+        self.assertEqual(weights[:10], [1] * 10)
+        self.assertEqual(weights[-1], 3)
+
+    def test_count_exact_and_weights_unbiased(self):
+        with mock.patch("shortener.services.click_sample_weight", return_value=10):
+            self.click(2000)
+
+        self.url.refresh_from_db()
+        self.assertEqual(self.url.click_count, 2000)
+        self.assertTrue(self.url.has_sampled_clicks)
+        clicks = Click.objects.filter(url=self.url)
+        self.assertLess(clicks.count(), 400)
+        self.assertEqual({click.weight for click in clicks}, {10})
+        total = clicks.aggregate(total=Sum("weight"))["total"]
+        self.assertAlmostEqual(total / 2000, 1, delta=0.15)
+
+    def test_reconcile_keeps_sampled_counts(self):
+        quiet = URL.objects.create(original_url="https://example.org/", short_code="q1")
+        Click.objects.create(url=quiet)
+        URL.objects.filter(pk=quiet.pk).update(click_count=5)
+
+        with mock.patch("shortener.services.click_sample_weight", return_value=10):
+            self.click(200)
+        # Sampling turned off later, the stored rows are still estimates
+        URL.objects.filter(pk=self.url.pk).update(adaptive_sampling=False)
+
+        result = reconcile_range(0, quiet.pk + 1)
+        self.assertEqual(result[2:4], (1, 1))
+        self.assertEqual(URL.objects.get(pk=self.url.pk).click_count, 200)
+        self.assertEqual(URL.objects.get(pk=quiet.pk).click_count, 1)
+
+
+class SearchTests(TestCase):
+    """Runs on the fully migrated schema, triggers restored after 0009"""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.alice = User.objects.create_user("alice", "alice@example.com", "x")
+        cls.bob = User.objects.create_user("bob", "bob@example.com", "x")
+
+    def search(self, user, query):
+        return [url.short_code for url in search_urls(user, query)[0]]
+
+    def create(self, code, original_url="https://docs.example.com/", user=None):
+        return URL.objects.create(
+            user=user or self.alice, original_url=original_url, short_code=code
+        )
+
+    def test_follows_inserts_updates_and_deletes(self):
+        url = self.create("guide1", "https://docs.example.com/setup")
+        self.assertEqual(self.search(self.alice, "setup"), ["guide1"])
+
+        url.original_url = "https://docs.example.com/install"
+        url.save()
+        self.assertEqual(self.search(self.alice, "setup"), [])
+        self.assertEqual(self.search(self.alice, "install"), ["guide1"])
+
+        url.delete()
+        self.assertEqual(self.search(self.alice, "install"), [])
+
+    def test_scoped_per_user(self):
+        url = self.create("shared1")
+        self.create("mine1", user=self.bob)
+        self.assertEqual(self.search(self.alice, "docs"), ["shared1"])
+
+        URL.objects.filter(pk=url.pk).update(user=self.bob)
+        self.assertEqual(self.search(self.alice, "docs"), [])
+        self.assertEqual(sorted(self.search(self.bob, "docs")), ["mine1", "shared1"])
+
+    def test_cursor_pages_dont_overlap(self):
+        for i in range(25):
+            self.create(f"page{i}", f"https://docs.example.com/{'a' * i}")
+
+        seen, cursor = [], None
+        while True:
+            urls, cursor = search_urls(self.alice, "docs", cursor, limit=10)
+            seen += [url.pk for url in urls]
+            if cursor is None:
+                break
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(len(set(seen)), 25)
+
+
+class SweepExpiredTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        soon = timezone.now() + timedelta(hours=1)
+        for i in range(5):
+            url = URL.objects.create(
+                original_url="https://example.com/",
+                short_code=f"old{i}",
+                expiration_date=soon,
+            )
+            Click.objects.create(url=url)
+        URL.objects.create(original_url="https://example.com/", short_code="keep1")
+
+    def setUp(self):
+        cache.clear()
+        self.later = timezone.now() + timedelta(hours=2)
+
+    def test_deactivates_in_batches(self):
+        with CaptureQueriesContext(connection) as queries:
+            swept = services.sweep_expired_urls(batch_size=2, now=self.later)
+        self.assertEqual(swept, 5)
+        updates = [q for q in queries if q["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 3)
+
+        self.assertEqual(URL.objects.filter(is_active=False).count(), 5)
+        self.assertEqual(Click.objects.count(), 5)
+        # Nothing left to sweep
+        self.assertEqual(services.sweep_expired_urls(now=self.later), 0)
+
+    def test_evicts_cached_redirects(self):
+        self.assertFalse(services.get_redirect_entry("old0")["expired"])
+        services.sweep_expired_urls(now=self.later)
+        self.assertIsNone(cache.get(services.redirect_cache_key("old0")))
+        self.assertTrue(services.get_redirect_entry("old0")["expired"])
+
+    def test_delete_command(self):
+        URL.objects.filter(short_code__startswith="old").update(
+            expiration_date=timezone.now() - timedelta(minutes=1)
+        )
+        self.assertIsNotNone(services.get_redirect_entry("old1"))
+
+        out = StringIO()
+        call_command("sweep_expired", "--delete", "--batch-size", "2", stdout=out)
+        self.assertIn("Deleted 5 expired URL(s).", out.getvalue())
+        self.assertEqual(
+            list(URL.objects.values_list("short_code", flat=True)), ["keep1"]
+        )
+        self.assertFalse(Click.objects.exists())
+        self.assertIsNone(services.get_redirect_entry("old1"))
@@ -11,13 +11,19 @@ urlpatterns = [
         name="login",
     ),
     path("logout/", views.logout_view, name="logout"),
-    path("<str:short_code>/", views.redirect_url, name="redirect"),
+    path("dashboard/", views.dashboard, name="dashboard"),
+    path("create/", views.create_url, name="create_url"),
+    path("search/", views.search, name="search"),
     path("edit/<str:short_code>/", views.edit_url, name="edit_url"),
+    path("delete/<str:short_code>/", views.delete_url, name="delete_url"),
     path("analytics/", views.analytics, name="analytics"),
     path(
         "url/<str:short_code>/analytics/",
         views.url_detail_analytics,
         name="url_detail_analytics",
     ),
+    path("b/<str:short_code>/", views.click_beacon, name="click_beacon"),
     path("", views.home, name="home"),
+    # Catch-all for short codes, keep last
+    path("<str:short_code>/", views.redirect_url, name="redirect"),
 ]
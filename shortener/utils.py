@@ -1,6 +1,8 @@
 import random
 import string
 
+from django.conf import settings
+
 
 # Base62 encoding function
 def base62_encode(num):
@@ -29,3 +31,51 @@ def generate_random_code(length=6):
     """Generate random alphanumeric code"""
     characters = string.ascii_letters + string.digits
     return "".join(random.choice(characters) for _ in range(length))
+
+
+def build_alias_table(weights):
+    """Vose alias table for picking index i with probability weights[i] / total
+
+    Returns (prob, alias) lists for pick_alias(). Weights must not all be 0.
+    """
+    count = len(weights)
+    total = sum(weights)
+    scaled = [weight * count / total for weight in weights]
+    prob = [1.0] * count
+    alias = list(range(count))
+
+    small = [i for i, p in enumerate(scaled) if p < 1]
+    large = [i for i, p in enumerate(scaled) if p >= 1]
+    while small and large:
+        less, more = small.pop(), large.pop()
+        # Column `less` is topped up with probability mass from `more`
+        prob[less] = scaled[less]
+        alias[less] = more
+        scaled[more] -= 1 - scaled[less]
+        (small if scaled[more] < 1 else large).append(more)
+
+    # Whatever is left is 1 up to rounding errors, prob stays 1.0
+    return prob, alias
+
+
+def pick_alias(prob, alias):
+    """Pick an index from an alias table in constant time"""
+    i = random.randrange(len(prob))
+    return i if random.random() < prob[i] else alias[i]
+
+
+def get_client_ip(request):
+    """Extract client IP address from request headers
+
+    X-Forwarded-For is set by the client too, so only the entries appended
+    by our own TRUSTED_PROXY_HOPS proxies are believed, counted from the
+    right. Without trusted proxies the connection address is used.
+    """
+    ip = request.META.get("REMOTE_ADDR")
+    hops = settings.TRUSTED_PROXY_HOPS
+    x_forwarded_for = request.META.get("HTTP_X_FORWARDED_FOR")
+    if hops and x_forwarded_for:
+        forwarded = [part.strip() for part in x_forwarded_for.split(",")]
+        if len(forwarded) >= hops:
+            ip = forwarded[-hops]
+    return ip
@@ -3,16 +3,49 @@ from django.contrib import messages
 from django.contrib.auth import logout
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import get_object_or_404, redirect
-from django.http import HttpResponseForbidden
-from django.db.models import F, Sum, Count, Q
+from django.conf import settings
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseForbidden,
+    HttpResponsePermanentRedirect,
+)
+from django.urls import reverse
+from django.utils.cache import (
+    add_never_cache_headers,
+    patch_cache_control,
+    patch_response_headers,
+)
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from django.db import router
+from django.db.models import Sum, Q
+from django.db.models.functions import Coalesce, ExtractHour
 from datetime import timedelta
 from django.utils import timezone
-from django.core.paginator import Paginator
+from django.core.cache import cache
+from django.core.paginator import Page, Paginator
+
+from analystics.services import bucket_start, click_series
+from url_shortener.db import read_replica
 
 from .forms import UserRegisterForm
 from .models import URL, Click
-from .forms import URLForm
-from .utils import generate_short_code, generate_random_code
+from .forms import DestinationFormSet, URLForm, URLEditForm
+from .search import search_urls
+from .services import (
+    beacon_token,
+    bump_cache_versions,
+    check_beacon_token,
+    choose_destination,
+    evict_redirect_cache,
+    get_redirect_entry,
+    record_click,
+    sample_weight,
+    url_cache_key,
+    user_cache_key,
+)
+from .utils import generate_short_code, generate_random_code, get_client_ip
 
 
 # Create your views here.
@@ -34,6 +67,7 @@ def register(request):
 
 
 @login_required  # Requires user to be logged in
+@read_replica
 def dashboard(request):
     # Get only URLs belonging to current user, ordered by newest first
     url_list = request.user.urls.all()  # Uses related_name from model
@@ -41,20 +75,46 @@ def dashboard(request):
     # Pagination (10 URLs per page)
     pagination = Paginator(url_list, 10)
     page_number = request.GET.get("page")
-    urls = pagination.get_page(page_number)
 
-    # Calculate total stats
-    total_clicks = sum(url.click_count for url in url_list)
-    total_urls = url_list.count()
+    # Anything but a number falls back to the first page anyway
+    page_key = page_number if page_number and page_number.isdigit() else 1
+    key = user_cache_key(request.user.id, "dashboard", page_key)
+    cached = cache.get(key)
+    if cached is None:
+        urls = pagination.get_page(page_number)
+
+        # Calculate total stats
+        total_clicks = url_list.aggregate(Sum("click_count"))["click_count__sum"]
+        cached = {
+            "object_list": list(urls.object_list),
+            "number": urls.number,
+            "total_urls": pagination.count,
+            "total_clicks": total_clicks or 0,
+        }
+        cache.set(key, cached, settings.PAGE_CACHE_TIMEOUT)
+    else:
+        # Rebuild the page without querying the count again
+        pagination.count = cached["total_urls"]
+        urls = Page(cached["object_list"], cached["number"], pagination)
 
     context = {
         "urls": urls,
-        "total_clicks": total_clicks,
-        "total_urls": total_urls,
+        "total_clicks": cached["total_clicks"],
+        "total_urls": cached["total_urls"],
     }
     return render(request, "shortener/dashboard.html", context)
 
 
+@login_required
+def search(request):
+    """Ranked search over the user's URLs, paginated by cursor"""
+    query = request.GET.get("q", "").strip()
+    urls, next_cursor = search_urls(request.user, query, request.GET.get("cursor"))
+
+    context = {"query": query, "urls": urls, "next_cursor": next_cursor}
+    return render(request, "shortener/search.html", context)
+
+
 @login_required
 def edit_url(request, short_code):
     # Get URL object or 404 if not found
@@ -66,16 +126,25 @@ def edit_url(request, short_code):
 
     if request.method == "POST":
         if request.method == "POST":
-            form = URLForm(request.POST, instance=url_obj)
-            if form.is_valid():
+            form = URLEditForm(request.POST, instance=url_obj)
+            formset = DestinationFormSet(request.POST, instance=url_obj)
+            if form.is_valid() and formset.is_valid():
                 form.save()
+                formset.save()
+                evict_redirect_cache(url_obj.short_code)
+                bump_cache_versions(user_id=url_obj.user_id, url_id=url_obj.id)
                 messages.success(request, "URL updated successfully!")
                 return redirect("dashboard")
     else:
         # Pre-fil form with existing data
-        form = URLForm(instance=url_obj)
+        form = URLEditForm(instance=url_obj)
+        formset = DestinationFormSet(instance=url_obj)
 
-    return render(request, "shortener/edit_url.html", {"form": form, "url": url_obj})
+    return render(
+        request,
+        "shortener/edit_url.html",
+        {"form": form, "formset": formset, "url": url_obj},
+    )
 
 
 @login_required
@@ -104,6 +173,7 @@ def create_url(request):
                 url_obj.short_code = generate_random_code()
 
             url_obj.save()  # Save to database
+            bump_cache_versions(user_id=request.user.id)
 
             # If using ID-based encoding, update short_code
             # url_obj.short_code = generate_short_code(url_obj.id)
@@ -128,39 +198,93 @@ def create_url(request):
 # Redirection Logic
 def redirect_url(request, short_code):
     """Redirect short code to original URL"""
-    # Get URL object or show 404
-    url_obj = get_object_or_404(URL, short_code=short_code)
-
-    # Check if expired
-    if url_obj.is_expired():
-        return render(request, "shortener/expired.html", {"url": url_obj})
-
-    # Increment click count (F() prevents race conditions)
-    url_obj.click_count = F("click_count") + 1
-    url_obj.save()
-    url_obj.refresh_from_db()  # Get updated count
-
-    # Optional: Log detailed click data
-    Click.objects.create(
-        url=url_obj,
-        clicked_at=timezone.now(),
-        ip_address=get_client_ip(request),
-        user_agent=request.META.get("HTTP_USER_AGENT", "")[:300],
-        referrer=request.META.get("HTTP_REFERER", ""),
-    )
+    # Cached lookup, 404 if the short code doesn't exist
+    entry = get_redirect_entry(short_code)
+    if entry is None:
+        raise Http404("Short URL not found.")
+
+    # Expired links stay cached as expired until edited
+    if entry["expired"]:
+        return render(
+            request, "shortener/expired.html", {"short_code": short_code}, status=410
+        )
+
+    destination_id, target = choose_destination(entry)
+    redirect_type = entry["redirect_type"]
+    max_age = entry["cache_max_age"]
+    if redirect_type == URL.RedirectType.PERMANENT:
+        max_age = max_age or settings.PERMANENT_REDIRECT_MAX_AGE
+
+    # Browsers and CDNs must not keep redirecting after the link expires
+    if entry["expiration_date"] is not None:
+        seconds_left = (entry["expiration_date"] - timezone.now()).total_seconds()
+        max_age = min(max_age, int(seconds_left))
+
+    # Split links pick per visit, a cached redirect would pin one destination
+    if destination_id is not None or max_age <= 0:
+        redirect_type = URL.RedirectType.NO_CACHE
+
+    if redirect_type == URL.RedirectType.PERMANENT:
+        if entry["beacon_sample_rate"]:
+            # Cacheable page that redirects in the browser, clicks are
+            # estimated from the sampled beacons it sends back
+            response = render(
+                request,
+                "shortener/beacon.html",
+                {
+                    "target": target,
+                    "beacon_url": reverse("click_beacon", args=[short_code]),
+                    "beacon_token": beacon_token(short_code, max_age),
+                    "sample_rate": entry["beacon_sample_rate"],
+                },
+            )
+        else:
+            record_click(request, entry)
+            response = HttpResponsePermanentRedirect(target)
 
-    # Redirect to original URL (302 = temporary redirect)
-    return redirect(url_obj.original_url)
+        patch_response_headers(response, max_age)
+        patch_cache_control(response, public=True)
+        return response
 
+    record_click(request, entry, destination_id=destination_id)
 
-def get_client_ip(request):
-    """Extract client IP address from request headers"""
-    x_forwarded_for = request.META.get("HTTP_X_FORWARDED_FOR")
-    if x_forwarded_for:
-        ip = x_forwarded_for.split(",")[0]
+    # Redirect to the target URL (302 = temporary redirect)
+    response = redirect(target)
+    if redirect_type == URL.RedirectType.TEMPORARY and max_age:
+        patch_response_headers(response, max_age)
+        patch_cache_control(response, public=True)
     else:
-        ip = request.META.get("REMOTE_ADDR")
-    return ip
+        add_never_cache_headers(response)
+    return response
+
+
+@csrf_exempt  # sendBeacon can't send a CSRF token
+@require_POST
+def click_beacon(request, short_code):
+    """Record a sampled click reported by beacon.html"""
+    entry = get_redirect_entry(short_code)
+
+    # Only beacons from a page we served, for as long as it may be cached,
+    # and once per client and link, a token can be replayed by anyone
+    if (
+        entry
+        and not entry["expired"]
+        and entry["beacon_sample_rate"]
+        and check_beacon_token(short_code, request.POST.get("token", ""))
+        and cache.add(
+            f"beacon:{short_code}:{get_client_ip(request)}",
+            1,
+            settings.BEACON_DEDUP_TIMEOUT,
+        )
+    ):
+        record_click(
+            request,
+            entry,
+            weight=sample_weight(entry["beacon_sample_rate"]),
+            referrer=request.POST.get("referrer", ""),
+        )
+
+    return HttpResponse(status=204)
 
 
 def delete_url(request, short_code):
@@ -172,6 +296,8 @@ def delete_url(request, short_code):
 
     if request.method == "POST":
         url_obj.delete()  # Remove from database
+        evict_redirect_cache(url_obj.short_code)
+        bump_cache_versions(user_id=request.user.id)
         messages.success(request, "URL deleted successfully!")
         return redirect("dashboard")
 
@@ -180,8 +306,20 @@ def delete_url(request, short_code):
 
 
 @login_required
+@read_replica
 def analytics(request):
-    user_urls = request.user.urls.all()
+    key = user_cache_key(request.user.id, "analytics")
+    context = cache.get(key)
+    if context is None:
+        context = build_analytics_context(request.user)
+        cache.set(key, context, settings.PAGE_CACHE_TIMEOUT)
+
+    return render(request, "shortener/analytics.html", context)
+
+
+def build_analytics_context(user):
+    """Compute the analytics dashboard for one user"""
+    user_urls = user.urls.all()
 
     # Overall statistics
     total_urls = user_urls.count()
@@ -195,27 +333,31 @@ def analytics(request):
 
     # Recent activity (last 7 days)
     week_ago = timezone.now() - timedelta(days=7)
-    recent_clicks = Click.objects.filter(
-        url__user=request.user, clicked_at__gte=week_ago
-    ).count()
-
-    # Clicks per day (last 7 days)
-    daily_clicks = []
-    for i in range(7):
-        day = timezone.now() - timedelta(days=i)
-        day_start = day.replace(hour=0, minute=0, second=0)
-        day_end = day.replace(hour=23, minute=59, second=59)
-
-        count = Click.objects.filter(
-            url__user=request.user, clicked_at__gte=day_start, clicked_at__lte=day_end
-        ).count()
-
-        daily_clicks.append({"date": day.strftime("%b %d"), "count": count})
+    # Weighted, as beacons and sampled links store one row for many clicks
+    recent_clicks = (
+        Click.objects.filter(url__user=user, clicked_at__gte=week_ago).aggregate(
+            total=Sum("weight")
+        )["total"]
+        or 0
+    )
 
-    daily_clicks.reverse()  # Oldest to newest
+    # Clicks per day (last 7 days), one GROUP BY query
+    now = timezone.now()
+    zone = timezone.get_current_timezone()
+    week_start = bucket_start(now - timedelta(days=6), "day", zone)
+    daily_clicks = [
+        {"date": day.strftime("%b %d"), "count": count}
+        for day, count in click_series(
+            Click.objects.filter(url__user=user),
+            week_start.replace(tzinfo=zone),
+            now,
+            "day",
+            zone,
+        )
+    ]
 
     # Top 5 URLs by clicks
-    top_urls = user_urls.order_by("-click_count")[:5]
+    top_urls = list(user_urls.order_by("-click_count")[:5])
 
     context = {
         "total_urls": total_urls,
@@ -226,29 +368,47 @@ def analytics(request):
         "daily_clicks": daily_clicks,
         "top_urls": top_urls,
     }
-
-    return render(request, "shortener/analytics.html", context)
+    return context
 
 
 @login_required
+@read_replica
 def url_detail_analytics(request, short_code):
     """Detailed analytics for specific URL"""
-    url_obj = get_object_or_404(URL, short_code=short_code)
+    # Cached lookup, same as redirects
+    entry = get_redirect_entry(short_code)
+    if entry is None:
+        raise Http404("Short URL not found.")
 
     # Verify ownership
-    if url_obj.user != request.user:
+    if entry["user_id"] != request.user.id:
         return HttpResponseForbidden("You don't own this URL.")
 
+    key = url_cache_key(entry["id"], "detail")
+    context = cache.get(key)
+    if context is None:
+        # The row itself from the primary, a new link may not be on the replica yet
+        url_obj = get_object_or_404(
+            URL.objects.using(router.db_for_write(URL)), pk=entry["id"]
+        )
+        context = build_url_detail_context(url_obj)
+        cache.set(key, context, settings.PAGE_CACHE_TIMEOUT)
+
+    return render(request, "shortener/url_detail.html", context)
+
+
+def build_url_detail_context(url_obj):
+    """Compute the analytics page for a single URL"""
     # Get all clicks for this URL
     all_clicks = url_obj.clicks.all().order_by("-clicked_at")
 
-    # Unique visitors (by IP)
+    # Unique visitors (by IP), a lower bound for sampled links
     unique_ips = url_obj.clicks.values("ip_address").distinct().count()
 
-    # Top referrers
-    top_referrers = (
+    # Top referrers, counts are summed weights of the stored clicks
+    top_referrers = list(
         url_obj.clicks.values("referrer")
-        .annotate(count=Count("id"))
+        .annotate(count=Sum("weight"))
         .order_by("-count")
         .exclude(referrer="")[:5]
     )
@@ -256,29 +416,42 @@ def url_detail_analytics(request, short_code):
     # Browser/Device breakdown (simplified)
     user_agents = (
         url_obj.clicks.values("user_agent")
-        .annotate(count=Count("id"))
+        .annotate(count=Sum("weight"))
         .order_by("-count")[:10]
     )
 
     # Geographic data (basic - IP-based would need external service)
     # For now, just show unique IPs
 
-    # Clicks y hour (24-hour breakdown)
-    hourly_clicks = []
-    for hour in range(24):
-        count = url_obj.clicks.filter(clicked_at__hour=hour).count()
-        hourly_clicks.append({"hour": f"{hour:02d}:00", "count": count})
+    # Clicks by hour (24-hour breakdown), one GROUP BY query
+    per_hour = dict(
+        url_obj.clicks.annotate(hour=ExtractHour("clicked_at"))
+        .values("hour")
+        .annotate(count=Sum("weight"))
+        .order_by()
+        .values_list("hour", "count")
+    )
+    hourly_clicks = [
+        {"hour": f"{hour:02d}:00", "count": per_hour.get(hour, 0)} for hour in range(24)
+    ]
+
+    # Traffic split of multi-destination links
+    destination_clicks = list(
+        url_obj.destinations.annotate(click_total=Coalesce(Sum("clicks__weight"), 0))
+        .order_by("pk")
+        .values("label", "target_url", "weight", "click_total")
+    )
 
     context = {
         "url": url_obj,
         "total_clicks": url_obj.click_count,
         "unique_visitors": unique_ips,
-        "recent_clicks": all_clicks[:20],  # Last 20 clicks
+        "recent_clicks": list(all_clicks[:20]),  # Last 20 clicks
         "top_referrers": top_referrers,
         "hourly_clicks": hourly_clicks,
+        "destination_clicks": destination_clicks,
     }
-
-    return render(request, "shortener/url_detail.html", context)
+    return context
 
 
 def home(request):
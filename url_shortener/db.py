@@ -0,0 +1,64 @@
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+
+# Set while a view decorated with @read_replica runs
+_use_replica = ContextVar("use_replica", default=False)
+
+# Apps whose reads may go to the replica, auth and sessions never do
+REPLICA_APPS = {"shortener", "analystics"}
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """connection_created hook applying SQLITE_PRAGMAS to new connections"""
+    if connection.vendor != "sqlite" or not settings.SQLITE_PRAGMAS:
+        return
+
+    read_only = "mode=ro" in str(connection.settings_dict["NAME"])
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            # The journal mode is stored in the file, only the writer sets it
+            if read_only and name == "journal_mode":
+                continue
+            cursor.execute(f"PRAGMA {name} = {value}")
+
+
+def read_replica(view):
+    """Send the reads of a view to the "replica" database, if configured
+
+    Goes inside @login_required, so sessions and users are always read from
+    the primary and a fresh login is never missing on a lagging replica.
+    """
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = _use_replica.set(True)
+        try:
+            return view(*args, **kwargs)
+        finally:
+            _use_replica.reset(token)
+
+    return wrapper
+
+
+class ReadReplicaRouter:
+    """Writes always go to the primary, reads only inside @read_replica views"""
+
+    def db_for_read(self, model, **hints):
+        if (
+            _use_replica.get()
+            and model._meta.app_label in REPLICA_APPS
+            and "replica" in settings.DATABASES
+        ):
+            return "replica"
+        return "default"
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == "default"
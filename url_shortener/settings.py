@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -51,6 +52,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "shortener.middleware.RateLimitMiddleware",
 ]
 
 ROOT_URLCONF = "url_shortener.urls"
@@ -83,6 +85,112 @@ DATABASES = {
     }
 }
 
+# PRAGMAs run on every new SQLite connection (see url_shortener/db.py)
+SQLITE_PRAGMAS = {}
+
+# Production profile: DJANGO_DB_PROFILE=production
+# WAL lets readers and the writer work at the same time, persistent
+# connections skip the PRAGMA setup per request, and heavy analytics reads
+# go to a read-only "replica" connection (the same file unless
+# DJANGO_DB_REPLICA points to a copy).
+if os.environ.get("DJANGO_DB_PROFILE") == "production":
+    DATABASES["default"].update(
+        {
+            "CONN_MAX_AGE": 600,
+            "CONN_HEALTH_CHECKS": True,
+            # Take the write lock up front instead of failing on upgrade
+            "OPTIONS": {"transaction_mode": "IMMEDIATE"},
+        }
+    )
+
+    replica_path = Path(os.environ.get("DJANGO_DB_REPLICA", BASE_DIR / "db.sqlite3"))
+    DATABASES["replica"] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": replica_path.resolve().as_uri() + "?mode=ro",
+        "CONN_MAX_AGE": 600,
+        "CONN_HEALTH_CHECKS": True,
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_ROUTERS = ["url_shortener.db.ReadReplicaRouter"]
+
+    SQLITE_PRAGMAS = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,  # ms
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64000,  # Negative = KiB, so 64 MB
+        "temp_store": "MEMORY",
+    }
+
+
+# Cache
+# Use a shared backend (Redis, Memcached) when running several processes,
+# otherwise evictions by the expiry sweeper only reach its own process.
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+
+# Seconds a short code lookup stays cached (capped by the link's expiry)
+REDIRECT_CACHE_TIMEOUT = 60 * 60
+
+# Seconds dashboard/analytics pages stay cached, edits and clicks
+# invalidate them earlier through versioned cache keys
+PAGE_CACHE_TIMEOUT = 60 * 5
+
+# Clicks invalidate a URL's and its owner's pages at most this often (seconds)
+CLICK_BUMP_INTERVAL = 30
+
+# A client's beacons for one link count once per this many seconds. Tokens
+# sit in public cached pages, so this is what stops replayed beacons from
+# inflating click counts (visitors sharing an address are undercounted).
+BEACON_DEDUP_TIMEOUT = 60
+
+# Click time series API: largest number of buckets per request, and the
+# size above which the JSON is streamed instead of built in memory
+ANALYTICS_SERIES_MAX_POINTS = 1_000_000
+ANALYTICS_SERIES_STREAM_THRESHOLD = 5_000
+# Buckets counted per query, long series are read in several short ones
+ANALYTICS_SERIES_QUERY_BUCKETS = 5_000
+
+# Click feed: events per page by default and at most
+CLICK_FEED_PAGE_SIZE = 5_000
+CLICK_FEED_MAX_PAGE_SIZE = 50_000
+
+# Click export: rows per query, the download streams page by page
+CLICK_EXPORT_PAGE_SIZE = 10_000
+
+# Cache lifetime of permanent redirects without their own max-age (1 year)
+PERMANENT_REDIRECT_MAX_AGE = 60 * 60 * 24 * 365
+
+# Links with adaptive sampling store every click until they get more than
+# this many per minute, then only 1 in N (weighted by N) to stay near it
+CLICK_SAMPLING_THRESHOLD = 600
+
+
+# Number of reverse proxies in front of the app that append the client
+# address to X-Forwarded-For. 0 uses REMOTE_ADDR, the header can be forged.
+TRUSTED_PROXY_HOPS = 0
+
+
+# Rate limiting
+# Token buckets per URL name: refill "rate" (tokens/second) up to "burst".
+# Optional "methods" limits which requests are counted, "per_user" adds a
+# second bucket per logged in session on top of the per-IP one.
+# Buckets live in process memory unless RATELIMIT_CACHE_ALIAS names a
+# shared cache (slower per request, but limits apply across processes).
+
+RATELIMIT_CACHE_ALIAS = None
+
+RATELIMIT_POLICIES = {
+    "redirect": {"rate": 10, "burst": 60},
+    "home": {"rate": 0.2, "burst": 10, "methods": ["POST"]},
+    "create_url": {"rate": 0.5, "burst": 20, "methods": ["POST"], "per_user": True},
+    "click_beacon": {"rate": 2, "burst": 20},
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -20,5 +20,6 @@ from django.urls import path, include
 
 urlpatterns = [
     path("admin/", admin.site.urls),
+    path("api/analytics/", include("analystics.urls")),
     path("", include("shortener.urls")),  # Include app URLs
 ]